@@ -0,0 +1,171 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Persistent cache of checker verdicts, addressed by file contents.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+CACHE_FORMAT = 1
+
+log = logging.getLogger('inspektor.cache')
+
+_SOURCE_DIGESTS = {}
+
+
+def cache_dir():
+    """
+    Directory holding the cache, honoring $XDG_CACHE_HOME.
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'inspektor')
+
+
+def source_digest(name):
+    """
+    Digest of the source code of a module.
+
+    Used as the version of inspektor's own checkers, so that cached
+    verdicts are invalidated whenever the checking code changes.
+
+    :param name: Name of an imported module.
+    """
+    if name not in _SOURCE_DIGESTS:
+        path = sys.modules[name].__file__
+        if path.endswith('.pyc') or path.endswith('.pyo'):
+            path = path[:-1]
+        try:
+            with open(path, 'rb') as source:
+                _SOURCE_DIGESTS[name] = hashlib.sha1(source.read()).hexdigest()
+        except (IOError, OSError):
+            _SOURCE_DIGESTS[name] = None
+    return _SOURCE_DIGESTS[name]
+
+
+class ResultCache(object):
+
+    """
+    On disk cache of the verdicts of one checker.
+
+    Entries are keyed by the contents of the checked file, the checker
+    name, the options affecting the verdict and the versions of the tools
+    involved, so a hit is only possible for an identical check.
+    """
+
+    def __init__(self, checker, options=None, versions=None, directory=None,
+                 enabled=True):
+        """
+        :param checker: Checker name.
+        :param options: JSON serializable options that affect the verdict.
+        :param versions: JSON serializable versions of the tools involved.
+        :param directory: Cache location (defaults to :func:`cache_dir`).
+        :param enabled: Whether the cache is used at all.
+        """
+        self.checker = checker
+        self.enabled = enabled
+        self.directory = os.path.join(directory or cache_dir(), checker)
+        salt = json.dumps([CACHE_FORMAT, checker, options, versions,
+                           list(sys.version_info[:2])], sort_keys=True)
+        self._salt = hashlib.sha1(salt.encode('utf-8'))
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data):
+        """
+        Cache key for the given file contents.
+
+        :param data: File contents, as bytes.
+        :return: The key, or None if the cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        digest = self._salt.copy()
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """
+        Verdict stored for a key.
+
+        :return: The verdict dictionary, or None on a miss.
+        """
+        if key is None:
+            return None
+        try:
+            with open(self._entry(key)) as entry:
+                return json.load(entry)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def account(self, hit):
+        """
+        Count a lookup in the hit rate statistics.
+
+        Lookups may happen in worker processes, so they are accounted for
+        by the process reporting the results.
+
+        :param hit: Whether the lookup was a hit (None if it didn't happen).
+        """
+        if hit is None:
+            return
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def set(self, key, verdict):
+        """
+        Store a verdict.
+
+        :param key: Key returned by :meth:`key`.
+        :param verdict: JSON serializable dictionary.
+        """
+        if key is None:
+            return
+        entry = self._entry(key)
+        try:
+            entry_dir = os.path.dirname(entry)
+            if not os.path.isdir(entry_dir):
+                os.makedirs(entry_dir)
+            fd, tmp = tempfile.mkstemp(dir=entry_dir)
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(verdict, tmp_file)
+            os.rename(tmp, entry)
+        except (IOError, OSError) as details:
+            log.debug('Unable to store cache entry %s: %s', entry, details)
+
+    def summary(self):
+        """
+        Human readable hit rate, or None if the cache was not used.
+        """
+        lookups = self.hits + self.misses
+        if not lookups:
+            return None
+        return '%s %d/%d hits (%.1f%%)' % (self.checker, self.hits, lookups,
+                                           100.0 * self.hits / lookups)
+
+
+def get_cache(args, checker, options=None, versions=None):
+    """
+    Cache for a checker, honoring the --no-cache command line option.
+    """
+    return ResultCache(checker, options=options, versions=versions,
+                       enabled=not getattr(args, 'no_cache', False))
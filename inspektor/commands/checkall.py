@@ -14,12 +14,13 @@ import os
 
 from cliff.command import Command
 
+from inspektor.commands.options import add_common_options
 from inspektor.indent import Reindenter
 from inspektor.license import LicenseChecker
 from inspektor.license import default_license
 from inspektor.license import license_mapping
-from inspektor.lint import Linter
-from inspektor.style import StyleChecker
+from inspektor.manifest import Manifest
+from inspektor.report import get_stream
 
 
 class CheckAllCommand(Command):
@@ -69,6 +70,9 @@ class CheckAllCommand(Command):
         parser.add_argument('--author', type=str,
                             help='Author string. Ex: "Author: Brandon Lindon <brandon.lindon@foocorp.com>"',
                             default="")
+        add_common_options(parser,
+                           jobs='running the indentation, style and '
+                                'license checks, besides the lint one')
         return parser
 
     def take_action(self, parsed_args):
@@ -76,6 +80,12 @@ class CheckAllCommand(Command):
         if not checked_paths:
             checked_paths = [os.getcwd()]
 
+        # pylint and pycodestyle are only imported when the command is
+        # actually run
+        from inspektor.lint import Linter
+        from inspektor.pipeline import Pipeline
+        from inspektor.style import StyleChecker
+
         reindenter = Reindenter(parsed_args, logger=self.log)
         style_checker = StyleChecker(parsed_args, logger=self.log)
         linter = Linter(parsed_args, logger=self.log)
@@ -86,13 +96,35 @@ class CheckAllCommand(Command):
             self.log.info('License check: disabled')
             license_checker = None
 
-        status = True
-        for path in checked_paths:
-            status &= reindenter.check(path=path)
-            status &= style_checker.check(path=path)
-            if license_checker is not None:
-                status &= license_checker.check(path=path)
-        status &= linter.check(checked_paths)
+        result_stream = get_stream(parsed_args)
+        for checker in (reindenter, style_checker, linter, license_checker):
+            if checker is not None:
+                checker.result_stream = result_stream
+
+        # Walk the tree once, every checker shares the same file list
+        manifest = Manifest(checked_paths, parsed_args, logger=self.log)
+        # The manifest logged why it couldn't list the changed files
+        status = not manifest.since_failed
+        for path in manifest.invalid:
+            self.log.error("Invalid location '%s'", path)
+            status = False
+        # Lint runs while the other checkers go through the files
+        checkers = [reindenter, style_checker, license_checker]
+        if not manifest.since_failed:
+            pipeline = Pipeline(parsed_args,
+                                [checker for checker in checkers
+                                 if checker is not None],
+                                linter, logger=self.log)
+            status &= pipeline.run(manifest)
+        if result_stream is not None:
+            result_stream.close()
+
+        checkers.append(linter)
+        cache_summary = [checker.cache.summary() for checker in checkers
+                         if checker is not None]
+        cache_summary = [summary for summary in cache_summary if summary]
+        if cache_summary:
+            self.log.info('Result cache: %s', ', '.join(cache_summary))
 
         if status:
             self.log.info('Global check PASS')
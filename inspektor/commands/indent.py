@@ -14,7 +14,9 @@ import os
 
 from cliff.command import Command
 
+from inspektor.commands.options import add_common_options
 from inspektor.indent import Reindenter
+from inspektor.report import get_stream
 
 
 class IndentCommand(Command):
@@ -35,6 +37,8 @@ class IndentCommand(Command):
                             help='Quoted string containing paths or '
                                  'patterns to be excluded from '
                                  'checking, comma separated')
+        add_common_options(parser, jobs='checking the indentation in '
+                                        'parallel')
         return parser
 
     def take_action(self, parsed_args):
@@ -42,10 +46,17 @@ class IndentCommand(Command):
             parsed_args.path = [os.getcwd()]
 
         reindenter = Reindenter(parsed_args, logger=self.log)
+        result_stream = get_stream(parsed_args)
+        reindenter.result_stream = result_stream
 
         status = True
         for path in parsed_args.path:
             status &= reindenter.check(path)
+        if result_stream is not None:
+            result_stream.close()
+        cache_summary = reindenter.cache.summary()
+        if cache_summary:
+            self.log.info('Result cache: %s', cache_summary)
         if status:
             self.log.info('Indentation check PASS')
             return 0
@@ -14,9 +14,11 @@ import os
 
 from cliff.command import Command
 
+from inspektor.commands.options import add_common_options
 from inspektor.license import LicenseChecker
 from inspektor.license import default_license
 from inspektor.license import license_mapping
+from inspektor.report import get_stream
 
 
 class LicenseCommand(Command):
@@ -49,6 +51,7 @@ class LicenseCommand(Command):
         parser.add_argument('--fix', action='store_true', default=False,
                             help='Fix any style problems found '
                                  '(needs autopep8 installed)')
+        add_common_options(parser)
         return parser
 
     def take_action(self, parsed_args):
@@ -58,8 +61,16 @@ class LicenseCommand(Command):
             path = os.getcwd()
 
         checker = LicenseChecker(parsed_args)
+        result_stream = get_stream(parsed_args)
+        checker.result_stream = result_stream
+        status = checker.check(path)
+        if result_stream is not None:
+            result_stream.close()
+        cache_summary = checker.cache.summary()
+        if cache_summary:
+            self.log.info('Result cache: %s', cache_summary)
 
-        if checker.check(path):
+        if status:
             self.log.info("License check PASS")
             return 0
         else:
@@ -15,7 +15,8 @@ import os
 
 from cliff.command import Command
 
-from inspektor.lint import Linter
+from inspektor.commands.options import add_common_options
+from inspektor.report import get_stream
 
 
 class LintCommand(Command):
@@ -45,14 +46,25 @@ class LintCommand(Command):
         parser.add_argument('--parallel', action='store', nargs='?',
                             default=multiprocessing.cpu_count(),
                             help="How many threads to use")
+        add_common_options(parser, diff=False)
         return parser
 
     def take_action(self, parsed_args):
         if not parsed_args.path:
             parsed_args.path = [os.getcwd()]
 
+        # pylint is only imported when the command is actually run
+        from inspektor.lint import Linter
+
         linter = Linter(parsed_args, logger=self.log)
+        result_stream = get_stream(parsed_args)
+        linter.result_stream = result_stream
         status = linter.check(parsed_args.path)
+        if result_stream is not None:
+            result_stream.close()
+        cache_summary = linter.cache.summary()
+        if cache_summary:
+            self.log.info('Result cache: %s', cache_summary)
 
         if status:
             self.log.info("Syntax check PASS")
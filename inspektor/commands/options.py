@@ -0,0 +1,72 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Command line options shared by the checking commands.
+"""
+import argparse
+
+from inspektor.report import REPORT_FORMATS
+
+
+class _DiffAction(argparse.Action):
+
+    """
+    Store the --diff output, and turn on --fix.
+    """
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, values)
+        # The fixes are made in memory only
+        namespace.fix = True
+
+
+def add_common_options(parser, diff=True, jobs=None):
+    """
+    Add the options shared by the checking commands to a parser.
+
+    :param parser: :class:`argparse.ArgumentParser` of the command.
+    :param diff: Whether the command fixes files, and can show the fixes
+                 with --diff.
+    :param jobs: What the --jobs processes do, for its help (no --jobs
+                 option when None).
+    """
+    if diff:
+        parser.add_argument('--diff', type=str, nargs='?', const='-',
+                            metavar='FILE', action=_DiffAction,
+                            help=('Write the fixes that --fix would make as '
+                                  'a unified diff to FILE (the standard '
+                                  'output by default), leaving the files '
+                                  'untouched'))
+    parser.add_argument('--no-cache', action='store_true', default=False,
+                        help='Do not use the cache of previous results')
+    if jobs is not None:
+        parser.add_argument('--jobs', '-j', type=int, default=1,
+                            metavar='N',
+                            help=('Number of processes %s. Default: '
+                                  '%%(default)s' % jobs))
+    parser.add_argument('--since', type=str, metavar='REV',
+                        help=('Only check files added or modified in '
+                              'the git work tree since revision REV. '
+                              'Use REV... to compare with the merge '
+                              'base of REV and HEAD'))
+    parser.add_argument('--json-lines', type=str, metavar='FILE',
+                        help=('Write a JSON record for each checked '
+                              'file and checker to FILE as soon as it '
+                              'is checked (- for the standard output)'))
+    parser.add_argument('--report', type=str, metavar='FILE',
+                        help=('Write a report with the findings and the '
+                              'time spent on each file and checker to '
+                              'FILE when done (- for the standard '
+                              'output)'))
+    parser.add_argument('--report-format', type=str, default='json',
+                        choices=REPORT_FORMATS,
+                        help='Format of the report. Default: %(default)s')
@@ -14,7 +14,8 @@ import os
 
 from cliff.command import Command
 
-from inspektor.style import StyleChecker
+from inspektor.commands.options import add_common_options
+from inspektor.report import get_stream
 
 
 class StyleCommand(Command):
@@ -43,6 +44,7 @@ class StyleCommand(Command):
                             help='Quoted string containing paths or '
                                  'patterns to be excluded from '
                                  'checking, comma separated')
+        add_common_options(parser, jobs='checking the style in parallel')
         return parser
 
     def take_action(self, parsed_args):
@@ -50,11 +52,21 @@ class StyleCommand(Command):
         if not paths:
             paths = [os.getcwd()]
 
+        # pycodestyle is only imported when the command is actually run
+        from inspektor.style import StyleChecker
+
         style_checker = StyleChecker(parsed_args, logger=self.log)
+        result_stream = get_stream(parsed_args)
+        style_checker.result_stream = result_stream
 
         status = True
         for path in paths:
             status &= style_checker.check(path)
+        if result_stream is not None:
+            result_stream.close()
+        cache_summary = style_checker.cache.summary()
+        if cache_summary:
+            self.log.info('Result cache: %s', cache_summary)
         if status:
             self.log.info("PEP8 compliance check PASS")
             return 0
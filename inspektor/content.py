@@ -0,0 +1,244 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Contents of the checked files, shared by all the checkers.
+"""
+import codecs
+import difflib
+import functools
+import io
+import mmap
+import os
+import tempfile
+import tokenize
+
+import six
+
+from .path import PathRegistry
+from .path import detect_encoding
+
+# Files at least this big are mapped in memory instead of read
+MMAP_THRESHOLD = 1024 * 1024
+
+if six.PY2:
+    DECODE_ERRORS = 'strict'
+else:
+    DECODE_ERRORS = 'surrogateescape'
+
+
+class FileContent(object):
+
+    """
+    Contents of one file, read from disk once and decoded once.
+
+    The raw bytes, the decoded text and the text lines (with universal
+    newlines, like a file opened in text mode) are all computed lazily.
+    Bytes that can't be decoded are preserved, so writing the text back
+    doesn't corrupt the file.
+    """
+
+    def __init__(self, path, dry_run=False):
+        """
+        :param path: Path to a regular file.
+        :param dry_run: Whether writes only change the contents in memory,
+                        leaving the file untouched (see :meth:`diff`).
+        """
+        self.path = path
+        self.dry_run = dry_run
+        self._original = None
+        self._raw = None
+        self._map = None
+        self._encoding = None
+        self._text = None
+        self._lines = None
+        self._tokens = None
+        self._token_error = None
+
+    @property
+    def raw(self):
+        """
+        File contents as a bytes like object.
+        """
+        if self._raw is None:
+            with open(self.path, 'rb') as content_file:
+                size = os.fstat(content_file.fileno()).st_size
+                if size >= MMAP_THRESHOLD:
+                    self._map = mmap.mmap(content_file.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+                    self._raw = self._map
+                else:
+                    self._raw = content_file.read()
+        return self._raw
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = detect_encoding(self.raw)
+        return self._encoding
+
+    def _decode(self):
+        # The text and its lines are made at once, the memory map of the
+        # file isn't needed afterwards
+        text = codecs.decode(self.raw, self.encoding, DECODE_ERRORS)
+        self._lines = io.StringIO(text, newline=None).readlines()
+        self._text = ''.join(self._lines)
+        self.close()
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._decode()
+        return self._text
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._decode()
+        return self._lines
+
+    def generate_tokens(self, keep=True):
+        """
+        Tokens of the text lines, like :func:`tokenize.generate_tokens`.
+
+        The lines are tokenized once, the tokens (and the error ending
+        them, if any) are shared by all the checkers of the file.
+
+        :param keep: Whether to keep the tokens for the checkers coming
+                     next. Keeping them isn't free, so the last checker
+                     needing them doesn't.
+        """
+        if self._tokens is None:
+            readline = functools.partial(next, iter(self.lines), '')
+            if not keep:
+                return tokenize.generate_tokens(readline)
+            self._tokens = []
+            try:
+                for token in tokenize.generate_tokens(readline):
+                    self._tokens.append(token)
+            except (SyntaxError, tokenize.TokenError) as details:
+                self._token_error = details
+        return self._replay_tokens()
+
+    def _replay_tokens(self):
+        for token in self._tokens:
+            yield token
+        if self._token_error is not None:
+            raise self._token_error
+
+    def close(self):
+        """
+        Release the memory map of the file, if any.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+            self._raw = None
+
+    def write(self, text):
+        """
+        Replace the contents of the file.
+
+        Nothing is written when the contents don't change, so the file
+        keeps its modification time. Otherwise the new contents go to a
+        temporary file that then replaces the original one, so the file is
+        never left half written.
+
+        :param text: New text of the file.
+        :return: Whether the contents changed.
+        """
+        raw = codecs.encode(text, self.encoding, DECODE_ERRORS)
+        # The current contents may be memory mapped
+        if raw == self.raw[:]:
+            return False
+        if self._original is None:
+            self._original = self.text
+        self.close()
+        if not self.dry_run:
+            _replace(self.path, raw)
+            PathRegistry().invalidate(self.path)
+        self._raw = raw
+        self._text = None
+        self._lines = None
+        self._tokens = None
+        self._token_error = None
+        return True
+
+    def diff(self):
+        """
+        Unified diff of the changes written to the file so far.
+
+        :return: The diff, empty if the contents didn't change.
+        """
+        if self._original is None:
+            return ''
+        return unified_diff(self.path, self._original, self.text)
+
+    def reload(self):
+        """
+        Forget the contents, so they are read again from disk.
+        """
+        self.close()
+        self._raw = None
+        self._encoding = None
+        self._text = None
+        self._lines = None
+        self._tokens = None
+        self._token_error = None
+
+
+def get_content(args, path):
+    """
+    Contents of a file, honoring the --diff command line option.
+    """
+    return FileContent(path, dry_run=bool(getattr(args, 'diff', None)))
+
+
+def _replace(path, raw):
+    # Symbolic links are kept, the file they point to is the one replaced
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(dir=directory or '.', prefix='.%s.' % name)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(raw)
+        os.chmod(tmp, stat.st_mode & 0o7777)
+        if hasattr(os, 'chown'):
+            try:
+                os.chown(tmp, stat.st_uid, stat.st_gid)
+            except OSError:
+                # Only possible for the owner to give the file away
+                pass
+        os.rename(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def unified_diff(path, before, after):
+    """
+    Unified diff between two texts of a file, git style.
+
+    :param path: Path to the file.
+    :param before: Old text.
+    :param after: New text.
+    """
+    name = os.path.relpath(path)
+    before = before.splitlines(True)
+    after = after.splitlines(True)
+    diff = []
+    for line in difflib.unified_diff(before, after, 'a/%s' % name,
+                                     'b/%s' % name):
+        diff.append(line)
+        if not line.endswith('\n'):
+            diff.append('\n\\ No newline at end of file\n')
+    return ''.join(diff)
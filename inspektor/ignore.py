@@ -0,0 +1,290 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Matching of paths against ignore patterns, following .gitignore rules.
+"""
+import os
+import re
+
+BUILTIN_IGNORE = ['*~', '*#', '*.swp', '*.py?', '*.o', '.git', '.svn']
+GITIGNORE = '.gitignore'
+
+_MATCHERS = {}
+
+
+def _translate_glob(glob):
+    """
+    Translate the body of a gitignore pattern into a regular expression.
+
+    Differently from :mod:`fnmatch`, wildcards never match a '/', unless
+    they are a '**' path component.
+    """
+    segments = glob.split('/')
+    parts = []
+    last = len(segments) - 1
+    for index, segment in enumerate(segments):
+        if segment == '**':
+            if index == last:
+                parts.append('.*')
+            else:
+                parts.append('(?:.*/)?')
+            continue
+        i, n = 0, len(segment)
+        regex = ''
+        while i < n:
+            char = segment[i]
+            i += 1
+            if char == '*':
+                regex += '[^/]*'
+            elif char == '?':
+                regex += '[^/]'
+            elif char == '\\' and i < n:
+                regex += re.escape(segment[i])
+                i += 1
+            elif char == '[':
+                j = i
+                if j < n and segment[j] in '!^':
+                    j += 1
+                if j < n and segment[j] == ']':
+                    j += 1
+                while j < n and segment[j] != ']':
+                    j += 1
+                if j >= n:
+                    regex += '\\['
+                else:
+                    body = segment[i:j].replace('\\', '\\\\')
+                    i = j + 1
+                    if body[0] in '!^':
+                        body = '^' + body[1:]
+                    regex += '[%s]' % body
+            else:
+                regex += re.escape(char)
+        if index != last:
+            regex += '/'
+        parts.append(regex)
+    return ''.join(parts)
+
+
+def parse_pattern(line):
+    """
+    Parse one line of a gitignore file.
+
+    :return: A (regex, negated, dir_only) tuple, or None for blank lines
+             and comments.
+    """
+    line = line.rstrip('\r\n')
+    while line.endswith(' ') and not line.endswith('\\ '):
+        line = line[:-1]
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith('\\!') or line.startswith('\\#'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    anchored = '/' in line
+    line = line.lstrip('/')
+    regex = _translate_glob(line)
+    if not anchored and not regex.startswith('(?:.*/)?'):
+        regex = '(?:.*/)?' + regex
+    return regex, negated, dir_only
+
+
+class _PatternSet(object):
+
+    """
+    Patterns of one ignore source, compiled into a single expression.
+
+    The alternatives are compiled in reverse order, so the first one to
+    match is the last matching pattern of the source, which is the one
+    that decides according to the gitignore rules. Negated alternatives
+    carry an empty group, so a single match tells both whether the path
+    matched and whether it was re-included.
+    """
+
+    def __init__(self, lines, base=''):
+        self.base = base
+        patterns = [parse_pattern(line) for line in lines]
+        patterns = [pattern for pattern in patterns if pattern]
+        self._files = self._compile([p for p in patterns if not p[2]])
+        self._dirs = self._compile(patterns)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        alternatives = []
+        for regex, negated, _ in reversed(patterns):
+            if negated:
+                regex += '()'
+            alternatives.append(regex)
+        return re.compile('(?:%s)\\Z' % '|'.join(alternatives), re.DOTALL)
+
+    def match(self, path, is_dir):
+        """
+        :return: True if ignored, False if re-included, None if no pattern
+                 matched the path.
+        """
+        regex = self._dirs if is_dir else self._files
+        if regex is None:
+            return None
+        if self.base:
+            if not path.startswith(self.base + '/'):
+                return None
+            path = path[len(self.base) + 1:]
+        match = regex.match(path)
+        if match is None:
+            return None
+        return match.lastindex is None
+
+
+def _read_lines(path):
+    try:
+        with open(path) as ignore_file:
+            return ignore_file.readlines()
+    except (IOError, OSError, UnicodeDecodeError):
+        return []
+
+
+class IgnoreMatcher(object):
+
+    """
+    Decides whether paths are ignored by inspektor.
+
+    Patterns come, by order of precedence, from the builtin list and the
+    --exclude command line option, from the .gitignore files of the
+    directories leading to the path (deeper files first), from the
+    repository's info/exclude file and from the user's global git ignore
+    file.
+    """
+
+    def __init__(self, root=None, exclude=None):
+        """
+        :param root: Directory the patterns are relative to (defaults to
+                     the current working directory).
+        :param exclude: Comma separated extra patterns or paths.
+        """
+        self._cwd = os.getcwd()
+        self.root = os.path.abspath(root or self._cwd)
+        patterns = list(BUILTIN_IGNORE)
+        if exclude:
+            patterns += [self._exclude_pattern(p) for p in exclude.split(',')]
+        self._command_line = _PatternSet(patterns)
+        git_dir = os.environ.get('GIT_DIR', os.path.join(self.root, '.git'))
+        config_home = os.environ.get('XDG_CONFIG_HOME',
+                                     os.path.join(os.path.expanduser('~'),
+                                                  '.config'))
+        self._repository = [
+            _PatternSet(_read_lines(os.path.join(git_dir, 'info', 'exclude'))),
+            _PatternSet(_read_lines(os.path.join(config_home, 'git',
+                                                 'ignore')))]
+        self._gitignores = {}
+        self._ignored_dirs = {}
+
+    def _exclude_pattern(self, pattern):
+        pattern = pattern.strip()
+        if os.path.isabs(pattern):
+            relative = os.path.relpath(pattern, self.root)
+            if not relative.startswith('..'):
+                return '/' + relative.replace(os.sep, '/')
+        elif pattern.startswith('./'):
+            return '/' + pattern[2:]
+        return pattern
+
+    def relative(self, path):
+        """
+        Path relative to the matcher root, with '/' as separator.
+
+        Paths outside of the root are kept absolute, so that only the
+        patterns that are not anchored to a directory apply to them.
+        """
+        path = os.path.normpath(os.path.join(self._cwd, path))
+        if path == self.root:
+            return ''
+        if path.startswith(self.root + os.sep):
+            path = path[len(self.root) + 1:]
+        if os.sep != '/':
+            path = path.replace(os.sep, '/')
+        return path
+
+    def _gitignore(self, directory):
+        try:
+            return self._gitignores[directory]
+        except KeyError:
+            lines = _read_lines(os.path.join(self.root, directory, GITIGNORE))
+            pattern_set = _PatternSet(lines, directory) if lines else None
+            self._gitignores[directory] = pattern_set
+            return pattern_set
+
+    def _match(self, path, is_dir):
+        verdict = self._command_line.match(path, is_dir)
+        if verdict is not None:
+            return verdict
+        directory = path
+        while directory and not path.startswith('/'):
+            directory = directory.rpartition('/')[0]
+            gitignore = self._gitignore(directory)
+            if gitignore is not None:
+                verdict = gitignore.match(path, is_dir)
+                if verdict is not None:
+                    return verdict
+        for pattern_set in self._repository:
+            verdict = pattern_set.match(path, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def _dir_ignored(self, directory):
+        try:
+            return self._ignored_dirs[directory]
+        except KeyError:
+            parent = directory.rpartition('/')[0]
+            ignored = ((parent and self._dir_ignored(parent)) or
+                       self._match(directory, True))
+            self._ignored_dirs[directory] = ignored
+            return ignored
+
+    def ignored(self, path, is_dir=None):
+        """
+        Whether a path, or any of the directories containing it, is ignored.
+
+        :param path: Path to a file or directory.
+        :param is_dir: Whether path is a directory, looked up when None.
+        """
+        relative = self.relative(path)
+        if not relative:
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if is_dir:
+            return self._dir_ignored(relative)
+        parent = relative.rpartition('/')[0]
+        if parent and self._dir_ignored(parent):
+            return True
+        return self._match(relative, False)
+
+
+def get_matcher(exclude=None):
+    """
+    Matcher for the current directory, built only once per run.
+
+    :param exclude: Comma separated extra patterns or paths.
+    """
+    key = (os.getcwd(), exclude)
+    matcher = _MATCHERS.get(key)
+    if matcher is None:
+        matcher = _MATCHERS[key] = IgnoreMatcher(exclude=exclude)
+    return matcher
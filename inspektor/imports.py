@@ -0,0 +1,312 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Graph of the imports between the python modules of a project.
+"""
+import ast
+import hashlib
+import os
+
+
+def module_name(path):
+    """
+    Dotted module name of a python file, and the directory it's relative to.
+
+    Parent directories are part of the name as long as they are packages.
+
+    :param path: Absolute path to a python file.
+    :return: Tuple with the module name and its root directory.
+    """
+    directory, filename = os.path.split(path)
+    parts = [os.path.splitext(filename)[0]]
+    if parts[0] == '__init__':
+        parts = []
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return '.'.join(parts), directory
+
+
+def _imported_names(tree, name, is_package):
+    """
+    Names of the modules a module may import, packages included.
+    """
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                package = name.split('.') if name else []
+                if not is_package:
+                    package = package[:-1]
+                if node.level > 1:
+                    package = package[:1 - node.level]
+                base = '.'.join([part for part in package + [base] if part])
+            if not base:
+                modules = [alias.name for alias in node.names]
+            else:
+                # Imported names may be submodules as well
+                modules = [base] + ['%s.%s' % (base, alias.name)
+                                    for alias in node.names
+                                    if alias.name != '*']
+        else:
+            continue
+        for module in modules:
+            parts = module.split('.')
+            # Importing a module imports its parent packages
+            for i in range(1, len(parts) + 1):
+                names.add('.'.join(parts[:i]))
+    return names
+
+
+class ImportGraph(object):
+
+    """
+    Imports between python files, resolved to the files being imported.
+
+    Only modules found under the root directory of the importing module,
+    or under one of the import paths, are followed, modules of the
+    standard library or of installed packages are not part of the graph.
+    """
+
+    def __init__(self, cache=None, import_paths=None):
+        """
+        :param cache: :class:`inspektor.cache.ResultCache` where the names
+                      imported by each file are kept, keyed by the digest
+                      of its contents (None to parse every file).
+        :param import_paths: Directories modules are imported from, after
+                             the root directory of the importing module,
+                             as in the sys.path pylint is given.
+        """
+        self.cache = cache
+        self.import_paths = [os.path.abspath(path)
+                             for path in import_paths or []]
+        self._imports = {}
+        self._resolved = {}
+        self._digests = {}
+        self._closures = {}
+        self._closure_digests = {}
+
+    def _resolve(self, root, name):
+        key = (root, name)
+        if key not in self._resolved:
+            path = None
+            for directory in [root] + self.import_paths:
+                base = os.path.join(directory, *name.split('.'))
+                for candidate in (base + '.py',
+                                  os.path.join(base, '__init__.py')):
+                    if os.path.isfile(candidate):
+                        path = candidate
+                        break
+                if path is not None:
+                    break
+            self._resolved[key] = path
+        return self._resolved[key]
+
+    def _scan(self, path, name, is_package):
+        """
+        Read a python file once, keeping the digest of its contents, and
+        return the names of the modules it may import.
+        """
+        try:
+            with open(path, 'rb') as source:
+                data = source.read()
+        except (IOError, OSError):
+            self._digests[path] = None
+            return set()
+        self._digests[path] = hashlib.sha1(data).hexdigest()
+        key = None
+        if self.cache is not None:
+            # Relative imports depend on where the module is
+            key = self.cache.key(('%s %s %s' % (name, is_package,
+                                                self._digests[path])
+                                  ).encode('utf-8'))
+            entry = self.cache.get(key)
+            if entry is not None:
+                return set(entry['names'])
+        try:
+            names = _imported_names(ast.parse(data, path), name, is_package)
+        except (SyntaxError, ValueError):
+            names = set()
+        if key is not None:
+            self.cache.set(key, {'names': sorted(names)})
+        return names
+
+    def imports(self, path):
+        """
+        Files directly imported by a python file.
+
+        :param path: Absolute path to a python file.
+        :return: Sorted list of absolute paths.
+        """
+        if path not in self._imports:
+            name, root = module_name(path)
+            is_package = os.path.basename(path) == '__init__.py'
+            imported = set()
+            for imported_name in self._scan(path, name, is_package):
+                imported_path = self._resolve(root, imported_name)
+                if imported_path is not None and imported_path != path:
+                    imported.add(imported_path)
+            self._imports[path] = sorted(imported)
+        return self._imports[path]
+
+    def _closure(self, path):
+        """
+        Set of the files a python file imports, directly or not, itself
+        included.
+
+        The modules of an import cycle share the same closure, and the
+        closure of a module is made of the closures of the modules it
+        imports, so closures are computed once per cycle, walking the
+        strongly connected components of the graph from the leaves up.
+        """
+        if path not in self._closures:
+            def successors(node):
+                # Known closures don't need to be walked again
+                if node in self._closures:
+                    return []
+                return self.imports(node)
+
+            for component in _strongly_connected([path], successors):
+                if component[0] in self._closures:
+                    continue
+                members = set(component)
+                closure = set(members)
+                for member in component:
+                    for imported in self.imports(member):
+                        if imported not in members:
+                            closure.update(self._closures[imported])
+                closure = frozenset(closure)
+                for member in component:
+                    self._closures[member] = closure
+        return self._closures[path]
+
+    def closure(self, path):
+        """
+        A python file and all the files it imports, directly or not.
+
+        :param path: Absolute path to a python file.
+        :return: Sorted list of absolute paths.
+        """
+        return sorted(self._closure(path))
+
+    def _digest(self, path):
+        if path not in self._digests:
+            self.imports(path)
+        return self._digests[path]
+
+    def digest(self, path):
+        """
+        Digest of the path and contents of a python file and of the
+        contents of everything it imports, directly or not.
+
+        The modules of an import cycle share the same closure, the path
+        and contents of the file itself tell them apart.
+
+        :param path: Absolute path to a python file.
+        """
+        closure = self._closure(path)
+        if closure not in self._closure_digests:
+            digest = hashlib.sha1()
+            for dependency in sorted(closure):
+                digest.update(('%s %s\n' % (dependency,
+                                            self._digest(dependency))
+                               ).encode('utf-8'))
+            self._closure_digests[closure] = digest.hexdigest()
+        return hashlib.sha1(('%s %s %s\n' % (path, self._digest(path),
+                                             self._closure_digests[closure])
+                             ).encode('utf-8')).hexdigest()
+
+    def clusters(self, paths):
+        """
+        Group python files by directory, merging the directories whose
+        modules import each other, directly or through other directories.
+
+        Files of different clusters are loosely coupled, so they can be
+        linted apart without inferring the same modules many times.
+
+        :param paths: Absolute paths to python files.
+        :return: List of clusters, each a list of paths in the given order.
+        """
+        members = {}
+        for path in paths:
+            members.setdefault(os.path.dirname(path), []).append(path)
+        edges = {}
+        for directory, files in members.items():
+            edges[directory] = set()
+            for path in files:
+                for imported in self.imports(path):
+                    imported_dir = os.path.dirname(imported)
+                    if imported_dir in members and imported_dir != directory:
+                        edges[directory].add(imported_dir)
+        clusters = []
+        for component in _strongly_connected(sorted(edges), edges.get):
+            clusters.append([path for directory in component
+                             for path in members[directory]])
+        order = dict((path, i) for i, path in enumerate(paths))
+        for cluster in clusters:
+            cluster.sort(key=order.get)
+        clusters.sort(key=lambda cluster: order[cluster[0]])
+        return clusters
+
+
+def _strongly_connected(nodes, successors):
+    """
+    Strongly connected components of a directed graph (Tarjan's algorithm,
+    without recursion).
+
+    :param nodes: Nodes the graph is walked from.
+    :param successors: Function returning the successors of a node.
+    :return: List of components, each one after all the components it
+             has edges to.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for start in nodes:
+        if start in index:
+            continue
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(sorted(successors(start))))]
+        while work:
+            node, pending = work[-1]
+            for successor in pending:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor,
+                                 iter(sorted(successors(successor)))))
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
@@ -12,14 +12,24 @@
 # Copyright: Red Hat 2013-2014
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
+import array
+import itertools
 import logging
-import os
+import operator
+import re
 import sys
 import tokenize
 
 import six
 
+from . import cache
+from .content import get_content
+from .manifest import Manifest
+from .path import FileChecker
 from .path import PathChecker
+from .result import FileResult
+from .result import Stopwatch
+from .utils import parallel
 from .utils import stacktrace
 
 
@@ -31,35 +41,143 @@ def _rstrip(line, JUNK='\n \t'):
     but at least one known Emacs user expects to keep junk like that, not
     mentioning Barry by name or anything <wink>.
     """
+    return line.rstrip(JUNK)
 
-    i = len(line)
-    while i > 0 and line[i - 1] in JUNK:
-        i -= 1
-    return line[:i]
+
+_LEADING_SPACES = re.compile(' *').match
 
 
 def _getlspace(line):
-    i, n = 0, len(line)
-    while i < n and line[i] == " ":
-        i += 1
-    return i
+    return _LEADING_SPACES(line).end()
+
+
+def _normalize(line):
+    """
+    Return line rstripped & tab-expanded, ending with a newline.
+
+    Lines already in that form are returned as they are, not copied.
+    """
+    if '\t' not in line and line[-1:] == '\n' and line[-2:-1] not in ' \t':
+        return line
+    line = _rstrip(line)
+    if '\t' in line:
+        line = line.expandtabs()
+    return line + '\n'
+
+
+# Characters changing the tokenizer state: brackets, strings, comments
+# and line continuations.
+_SCAN_TOKEN = re.compile(r'[][(){}#\\\'"]')
+_STRING_END = dict((quote, re.compile(r'\\[\s\S]|' + quote))
+                   for quote in ('"', "'", '"""', "'''"))
+_PREFIX_CHARS = set('rRbBuUfFtT')
+# f-strings can nest quotes of their own kind since python 3.12
+_NESTED_FSTRINGS = sys.version_info >= (3, 12)
+
+
+def _canonical(lines):
+    """
+    Cheap check telling whether Run would leave lines as they are.
+
+    Lines are scanned for brackets, strings, comments and continuation
+    lines, just enough to find where statements start. Lines are known
+    not to change when none has tabs, trailing whitespace or a missing
+    newline, the file doesn't end with blank lines and every statement
+    is indented 4 spaces per level. Indented comments are then always
+    left alone, as are the lines continuing a statement.
+
+    :param lines: File lines, as in Run.raw.
+    :return: True if lines are canonical, False if that can't be told
+             without tokenizing them.
+    """
+    stack = [0]
+    depth = 0
+    string = None
+    continued = False
+    for line in lines:
+        if (not line.endswith('\n') or '\t' in line or
+                line[-2:-1] == ' '):
+            return False
+        i = 0
+        if string is None and depth == 0 and not continued:
+            stripped = line.lstrip(' ')
+            if stripped[0] in '#\n':
+                # Comment or blank line
+                continue
+            if stripped[0] in '\f\\':
+                # Form feed, or a statement starting on the next line,
+                # whose indentation is not the one of this line
+                return False
+            width = len(line) - len(stripped)
+            if width > stack[-1]:
+                stack.append(width)
+            while width < stack[-1]:
+                stack.pop()
+            if width != stack[-1] or width != 4 * (len(stack) - 1):
+                return False
+            i = width
+        continued = False
+        while True:
+            if string is not None:
+                match = _STRING_END[string].search(line, i)
+                if match is None:
+                    if len(string) == 1:
+                        # Unterminated single quoted string
+                        return False
+                    break
+                i = match.end()
+                if match.group() == string:
+                    string = None
+                elif i == len(line) and len(string) == 1:
+                    # Single quoted string continued by a backslash
+                    break
+                continue
+            match = _SCAN_TOKEN.search(line, i)
+            if match is None:
+                break
+            char = match.group()
+            i = match.end()
+            if char == '#':
+                break
+            elif char == '\\':
+                if i != len(line) - 1:
+                    return False
+                continued = True
+                break
+            elif char in '([{':
+                depth += 1
+            elif char in ')]}':
+                depth -= 1
+                if depth < 0:
+                    return False
+            else:
+                start = match.start()
+                prefix = start
+                while prefix > 0 and line[prefix - 1] in _PREFIX_CHARS:
+                    prefix -= 1
+                if _NESTED_FSTRINGS and set(line[prefix:start]) & set('fFtT'):
+                    return False
+                if line[start:start + 3] == char * 3:
+                    string = char * 3
+                    i = start + 3
+                else:
+                    string = char
+    if string is not None or depth or continued:
+        return False
+    return not lines or lines[-1] != '\n'
 
 
 class Run(object):
 
-    def __init__(self, f):
+    def __init__(self, lines, tokens=None):
         self.find_stmt = 1  # next token begins a fresh stmt?
         self.level = 0      # current indent level
         # Raw file lines.
-        self.raw = f.readlines()
-        f.close()
-
-        # File lines, rstripped & tab-expanded.  Dummy at start is so
-        # that we can use tokenize's 1-based line numbering easily.
-        # Note that a line is all-blank iff it's "\n".
-        self.lines = [_rstrip(line).expandtabs() + "\n"
-                      for line in self.raw]
-        self.lines.insert(0, None)
+        self.raw = lines
+        # Callable returning the tokens of the raw lines, if already known
+        self.tokens = tokens
+        # File lines, rstripped & tab-expanded, set up by run().
+        self.lines = None
         self.index = 1  # index into self.lines of next line
 
         # List of (lineno, indentlevel) pairs, one for each stmt and
@@ -69,11 +187,31 @@ class Run(object):
         self.stats = []
 
     def run(self):
+        # Most files need no changes, tell it without tokenizing them
+        if _canonical(self.raw):
+            self.after = self.raw
+            return False
+
+        # File lines, rstripped & tab-expanded.  Dummy at start is so
+        # that we can use tokenize's 1-based line numbering easily.
+        # Note that a line is all-blank iff it's "\n".
+        self.lines = [None]
+        self.lines.extend(_normalize(line) for line in self.raw)
+        # Count of leading spaces of each line
+        lspace = array.array('I', [0])
+        lspace.extend(_getlspace(line) for line in self.lines[1:])
+
         # pylint: disable=E1121
         if six.PY2:
             tokenize.tokenize(self.getline, self.tokeneater)
         else:
-            tokens = tokenize.generate_tokens(self.getline)
+            # Tokens of the raw lines do as long as no line was normalized
+            if self.tokens is not None and all(
+                    six.moves.map(operator.is_, self.raw,
+                                  itertools.islice(self.lines, 1, None))):
+                tokens = self.tokens()
+            else:
+                tokens = tokenize.generate_tokens(self.getline)
             for _token in tokens:
                 self.tokeneater(*_token)
         # Remove trailing empty lines.
@@ -83,6 +221,21 @@ class Run(object):
         # Sentinel.
         stats = self.stats
         stats.append((len(lines), 0))
+        # Index in stats of the statements (not comments) right after and
+        # right before each entry, -1 when there is none. The sentinel
+        # doesn't count as a statement.
+        next_stmt = [-1] * len(stats)
+        j = -1
+        for i in range(len(stats) - 2, -1, -1):
+            next_stmt[i] = j
+            if stats[i][1] >= 0:
+                j = i
+        prev_stmt = [-1] * len(stats)
+        j = -1
+        for i in range(len(stats)):
+            prev_stmt[i] = j
+            if stats[i][1] >= 0:
+                j = i
         # Map count of leading spaces to # we want.
         have2want = {}
         # Program after transformation.
@@ -94,7 +247,7 @@ class Run(object):
         for i in range(len(stats) - 1):
             thisstmt, thislevel = stats[i]
             nextstmt = stats[i + 1][0]
-            have = _getlspace(lines[thisstmt])
+            have = lspace[thisstmt]
             want = thislevel * 4
             if want < 0:
                 # A comment line.
@@ -103,21 +256,15 @@ class Run(object):
                     # indentation before, reuse what it most recently
                     # mapped to.
                     want = have2want.get(have, -1)
-                    if want < 0:
+                    if want < 0 and next_stmt[i] >= 0:
                         # Then it probably belongs to the next real stmt.
-                        for j in range(i + 1, len(stats) - 1):
-                            jline, jlevel = stats[j]
-                            if jlevel >= 0:
-                                if have == _getlspace(lines[jline]):
-                                    want = jlevel * 4
-                                break
-                    if want < 0:
-                        for j in range(i - 1, -1, -1):
-                            jline, jlevel = stats[j]
-                            if jlevel >= 0:
-                                want = have + _getlspace(after[jline - 1]) - \
-                                    _getlspace(lines[jline])
-                                break
+                        jline, jlevel = stats[next_stmt[i]]
+                        if have == lspace[jline]:
+                            want = jlevel * 4
+                    if want < 0 and prev_stmt[i] >= 0:
+                        jline, jlevel = stats[prev_stmt[i]]
+                        want = have + _getlspace(after[jline - 1]) - \
+                            lspace[jline]
                     if want < 0:
                         # Still no luck -- leave it alone.
                         want = have
@@ -129,14 +276,15 @@ class Run(object):
             if diff == 0 or have == 0:
                 after.extend(lines[thisstmt:nextstmt])
             else:
-                for line in lines[thisstmt:nextstmt]:
+                for j in range(thisstmt, nextstmt):
+                    line = lines[j]
                     if diff > 0:
                         if line == "\n":
                             after.append(line)
                         else:
                             after.append(" " * diff + line)
                     else:
-                        remove = min(_getlspace(line), -diff)
+                        remove = min(lspace[j], -diff)
                         after.append(line[remove:])
         return self.raw != self.after
 
@@ -194,64 +342,108 @@ class Run(object):
                 self.stats.append((sline, self.level))
 
 
-class Reindenter(object):
+class Reindenter(FileChecker):
+
+    label = 'Indent'
 
     def __init__(self, args, logger=logging.getLogger('')):
-        self.args = args
-        self.failed_paths = []
-        self.log = logger
+        super(Reindenter, self).__init__(args, logger)
+        self.cache = cache.get_cache(args, 'indent',
+                                     versions=[cache.source_digest(__name__)])
 
-    def check_file(self, path):
+    def check_file(self, path, content=None):
         """
         Check one regular file for indentation errors.
 
         :param path: Path to a regular file.
+        :param content: :class:`inspektor.content.FileContent` of the file,
+                        shared with other checkers (read when None).
         :return: False, if reindenter found problems, True, if reindenter
                  didn't find problems, path is not a python module or
                  script.
         """
-        checker = PathChecker(path=path, args=self.args, label='Indent',
+        checker = PathChecker(path=path, args=self.args, label=self.label,
                               logger=self.log)
         if not checker.check_attributes('text', 'python', 'not_empty'):
             return True
+        return self.report(self.check_content(path, content))
+
+    def check_content(self, path, content=None):
+        """
+        Check a python file for indentation errors, without reporting the
+        outcome. With --fix, the file is rewritten in place.
 
-        f = open(path)
-        r = Run(f)
-        f.close()
+        :param path: Path to a python file.
+        :param content: :class:`inspektor.content.FileContent` of the file
+                        (read when None).
+        :rtype: :class:`inspektor.result.FileResult`
+        """
+        stopwatch = Stopwatch()
+        if content is None:
+            content = get_content(self.args, path)
+        result = FileResult(path, 'indent')
+        cache_key = self.lookup(result, content)
+        if result.cached:
+            return stopwatch.stop(result)
+        r = Run(content.lines, content.generate_tokens)
         try:
             if r.run():
-                self.failed_paths.append(path)
-                fix_status = ''
+                result.status = False
+                # One finding per run of changed lines
+                changed = False
+                for number, (before, after) in enumerate(
+                        six.moves.zip_longest(r.raw, r.after), 1):
+                    if before != after and not changed:
+                        result.messages.append((number, 1, 'indent',
+                                                'Wrong indentation'))
+                    changed = before != after
                 if self.args.fix:
-                    f = open(path, "w")
-                    r.write(f)
-                    f.close()
-                    fix_status = 'FIX OK'
-                checker.log_status(status='FAIL', extra=fix_status)
-                return False
+                    content.write(''.join(r.after))
+                    result.fix_status = 'FIX OK'
+                    if content.dry_run:
+                        result.diff = content.diff()
             else:
-                checker.log_status(status='PASS')
-                return True
+                self.cache.set(cache_key, {'status': True})
         except IndentationError:
-            self.log.error("Indentation check fail  : %s", path)
-            self.log.error("Automated fix impossible: %s", path)
-            self.log.error("Look at the stack trace "
-                           "below and fix it manually")
+            result.status = False
+            result.log.append((logging.ERROR,
+                               "Indentation check fail  : %s" % path))
+            result.log.append((logging.ERROR,
+                               "Automated fix impossible: %s" % path))
+            result.log.append((logging.ERROR, "Look at the stack trace "
+                               "below and fix it manually"))
             exc_info = sys.exc_info()
-            stacktrace.log_exc_info(exc_info, 'inspektor.reindent')
-            return False
+            for line in stacktrace.prepare_exc_info(exc_info).splitlines():
+                result.log.append((logging.ERROR, line))
+        return stopwatch.stop(result)
+
+    def check_manifest(self, manifest):
+        """
+        Check all the files of a manifest for indentation errors.
+
+        With more than one job, files are spread across worker processes,
+        and results are reported in the same order as in a serial run.
+        Every file of the manifest is checked (and fixed) by a single
+        worker, so workers never write to the same file.
+
+        :param manifest: :class:`inspektor.manifest.Manifest` instance.
+        """
+        status = True
+        for result in parallel.imap(Reindenter, self.args, 'check_content',
+                                    manifest.files,
+                                    getattr(self.args, 'jobs', 1) or 1,
+                                    instance=self):
+            status &= self.report(result)
+        return status
 
     def check_dir(self, path):
-        for root, dirs, files in os.walk(path):
-            for filename in files:
-                self.check_file(os.path.join(root, filename))
-        return not self.failed_paths
+        return self.check_manifest(Manifest([path], self.args, self.log))
 
     def check(self, path):
-        if os.path.isfile(path):
-            return self.check_file(path)
-        elif os.path.isdir(path):
-            return self.check_dir(path)
-        else:
+        manifest = Manifest([path], self.args, self.log)
+        if manifest.since_failed:
+            return False
+        if manifest.invalid:
             self.log.warning("Invalid location '%s'", path)
             return False
+        return self.check_manifest(manifest)
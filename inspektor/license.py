@@ -13,9 +13,15 @@
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
 import logging
-import os
 
+from . import cache
+from .content import get_content
+from .manifest import Manifest
+from .path import FileChecker
 from .path import PathChecker
+from .result import FileResult
+from .result import Stopwatch
+from .utils import parallel
 
 
 LICENSE_SNIPPET_GPLV2 = """# This program is free software; you can redistribute it and/or modify
@@ -46,15 +52,15 @@ license_mapping = {'gplv2_later': LICENSE_SNIPPET_GPLV2,
 default_license = 'gplv2_later'
 
 
-class LicenseChecker(object):
+class LicenseChecker(FileChecker):
+
+    label = 'License'
 
     def __init__(self, args, logger=logging.getLogger('')):
+        super(LicenseChecker, self).__init__(args, logger)
         self.license_type = args.license
         cpyright = args.copyright
         author = args.author
-        self.args = args
-        self.failed_paths = []
-        self.log = logger
         self.license_contents = license_mapping[self.license_type]
         self.base_license_contents = self.license_contents
 
@@ -65,52 +71,86 @@ class LicenseChecker(object):
         if author:
             self.license_contents += "# " + author + "\n"
 
-    def check_dir(self, path):
-        for root, dirs, files in os.walk(path):
-            for filename in files:
-                self.check_file(os.path.join(root, filename))
+        self.cache = cache.get_cache(args, 'license',
+                                     options=self.base_license_contents,
+                                     versions=[cache.source_digest(__name__)])
+
+    def check_manifest(self, manifest):
+        """
+        Check all the files of a manifest for the license header.
+
+        :param manifest: :class:`inspektor.manifest.Manifest` instance.
+        """
+        for result in parallel.imap(LicenseChecker, self.args,
+                                    'check_content', manifest.files,
+                                    getattr(self.args, 'jobs', 1) or 1,
+                                    instance=self):
+            self.report(result)
         return not self.failed_paths
 
-    def check_file(self, path):
-        checker = PathChecker(path=path, args=self.args, label='License',
+    def check_dir(self, path):
+        return self.check_manifest(Manifest([path], self.args, self.log))
+
+    def check_file(self, path, content=None):
+        checker = PathChecker(path=path, args=self.args, label=self.label,
                               logger=self.log)
         # Don't put license info in empty __init__.py files.
         if not checker.check_attributes('text', 'python', 'not_empty'):
             return True
-
+        return self.report(self.check_content(path, content))
+
+    def check_content(self, path, content=None):
+        """
+        Check a python file for the license header, without reporting the
+        outcome. With --fix, the header is added to the file.
+
+        :param path: Path to a python file.
+        :param content: :class:`inspektor.content.FileContent` of the file
+                        (read when None).
+        :rtype: :class:`inspektor.result.FileResult`
+        """
+        stopwatch = Stopwatch()
+        if content is None:
+            content = get_content(self.args, path)
+        result = FileResult(path, 'license')
+        cache_key = self.lookup(result, content)
+        if result.cached:
+            return stopwatch.stop(result)
+
+        checker = PathChecker(path=path, args=self.args, label=self.label,
+                              logger=self.log)
         first_line = None
         if checker.path.script('python'):
             first_line = checker.path.first_line
 
-        with open(path, 'r') as inspected_file:
-            content = inspected_file.readlines()
-            if first_line is not None:
-                content = content[1:]
-            content = "".join(content)
-            if self.base_license_contents not in content:
-                fix_status = ''
-                if self.args.fix:
-                    new_content = ""
-                    if first_line is not None:
-                        new_content += first_line
-                        new_content += '\n'
-                    new_content += self.license_contents + '\n' + content
-                    with open(path, 'w') as inspected_file:
-                        inspected_file.write(new_content)
-                        fix_status = 'FIX OK'
-
-                self.failed_paths.append(path)
-                checker.log_status(status='FAIL', extra=fix_status)
-                return False
-            else:
-                checker.log_status(status='PASS')
-                return True
+        lines = content.lines
+        if first_line is not None:
+            lines = lines[1:]
+        text = "".join(lines)
+        if self.base_license_contents not in text:
+            result.status = False
+            result.messages.append((1, 1, 'license',
+                                    'Missing %s license header' %
+                                    self.license_type))
+            if self.args.fix:
+                new_content = ""
+                if first_line is not None:
+                    new_content += first_line
+                    new_content += '\n'
+                new_content += self.license_contents + '\n' + text
+                content.write(new_content)
+                result.fix_status = 'FIX OK'
+                if content.dry_run:
+                    result.diff = content.diff()
+        else:
+            self.cache.set(cache_key, {'status': True})
+        return stopwatch.stop(result)
 
     def check(self, path):
-        if os.path.isfile(path):
-            return self.check_file(path)
-        elif os.path.isdir(path):
-            return self.check_dir(path)
-        else:
+        manifest = Manifest([path], self.args, self.log)
+        if manifest.since_failed:
+            return False
+        if manifest.invalid:
             self.log.error("Invalid location '%s'", path)
             return False
+        return self.check_manifest(manifest)
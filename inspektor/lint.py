@@ -12,16 +12,45 @@
 # Copyright: Red Hat 2013-2014
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
+import functools
 import logging
+import multiprocessing
 import os
 import sys
 
+import pylint
+import six
 from pylint.lint import Run, PyLinter
+from pylint.reporters.text import TextReporter
 
-from .path import PathChecker
-from .utils import process
+from . import cache
+from .imports import ImportGraph
+from .manifest import Manifest
+from .report import get_output
+from .result import FileResult
+from .result import Stopwatch
+from .utils import vcs
 
-_PYLINT_HELP_TEXT = process.run('pylint --help', verbose=False).stdout
+# Bits of pylint's exit status set by each message category
+_MSG_STATUS = {'F': 1, 'E': 2, 'W': 4, 'R': 8, 'C': 16}
+
+# Option names supported by pylint, per pylint version
+_PYLINT_OPTIONS = {}
+
+
+def get_pylint_options():
+    """
+    Names of the options supported by the installed pylint.
+
+    They are read from the option definitions of pylint's linter, instead
+    of running pylint --help in a subprocess.
+    """
+    version = getattr(pylint, '__version__', None)
+    if version not in _PYLINT_OPTIONS:
+        linter = PyLinter()
+        _PYLINT_OPTIONS[version] = frozenset(option[0]
+                                             for option in linter.options)
+    return _PYLINT_OPTIONS[version]
 
 
 class QuietPyLinter(PyLinter):
@@ -37,6 +66,16 @@ class QuietPyLinter(PyLinter):
 
         return super(QuietPyLinter, self).read_config_file()
 
+    def check_astroid_module(self, *args, **kwargs):
+        try:
+            return super(QuietPyLinter, self).check_astroid_module(*args,
+                                                                   **kwargs)
+        finally:
+            # Reporters of worker processes don't keep track of modules
+            module_checked = getattr(self.reporter, 'module_checked', None)
+            if module_checked is not None:
+                module_checked()
+
 
 class QuietLintRun(Run):
     LinterClass = QuietPyLinter
@@ -49,6 +88,192 @@ class QuietLintRun(Run):
             super(QuietLintRun, self).__init__(*args, **kwargs)
 
 
+class ModuleReporter(TextReporter):
+
+    """
+    Text reporter keeping apart the output of each linted file.
+
+    Messages not related to any of the files are written right away.
+    """
+
+    def __init__(self, output=None, module_done=None):
+        """
+        :param output: Stream where messages not related to any of the
+                       files are written.
+        :param module_done: Called with the absolute path of each file
+                            pylint checked, as soon as pylint moves on
+                            from it.
+        """
+        super(ModuleReporter, self).__init__(output or sys.stdout)
+        self._stdout = self.out
+        self._outputs = {}
+        self._status = {}
+        self._messages = {}
+        self._current = None
+        self._checked = False
+        self.module_done = module_done
+        self.global_status = 0
+        # Wall and CPU time spent on each file
+        self.timings = {}
+
+    def on_set_current_module(self, module, filepath):
+        self.finish_module()
+        if filepath:
+            self._current = (os.path.abspath(filepath), Stopwatch())
+        return super(ModuleReporter, self).on_set_current_module(module,
+                                                                 filepath)
+
+    def on_close(self, stats, previous_stats):
+        self.finish_module()
+        return super(ModuleReporter, self).on_close(stats, previous_stats)
+
+    def module_checked(self):
+        """
+        Note that pylint checked the current file.
+
+        pylint may visit a file more than once (to parse it, then to check
+        it), it's only done with it when it moves on after checking it.
+        """
+        self._checked = True
+
+    def finish_module(self):
+        """
+        Stop measuring the time spent on the file being linted, and tell
+        if pylint is done with it.
+        """
+        if self._current is not None:
+            path, stopwatch = self._current
+            wall, cpu = self.timings.get(path, (0, 0))
+            elapsed_wall, elapsed_cpu = stopwatch.elapsed()
+            self.timings[path] = (wall + elapsed_wall, cpu + elapsed_cpu)
+            self._current = None
+            if self._checked and self.module_done is not None:
+                self.module_done(path)
+        self._checked = False
+
+    def handle_message(self, msg):
+        path = getattr(msg, 'abspath', None) or msg.path
+        status = _MSG_STATUS.get(msg.C, 0)
+        if not path:
+            self.global_status |= status
+            return super(ModuleReporter, self).handle_message(msg)
+        path = os.path.abspath(path)
+        if path not in self._outputs:
+            self._outputs[path] = six.StringIO()
+            self._status[path] = 0
+            self._messages[path] = []
+        self._status[path] |= status
+        self._messages[path].append((msg.line, msg.column, msg.msg_id,
+                                     msg.msg))
+        self.out = self._outputs[path]
+        try:
+            return super(ModuleReporter, self).handle_message(msg)
+        finally:
+            self.out = self._stdout
+
+    def verdict(self, path):
+        """
+        Output and status of a linted file.
+
+        :param path: Path to a linted file.
+        :return: Dictionary with the 'output' text, the 'msg_status' bits
+                 set by its messages and the 'messages', as (line, column,
+                 code, text) lists.
+        """
+        path = os.path.abspath(path)
+        output = self._outputs.pop(path, None)
+        return {'output': output.getvalue() if output else '',
+                'msg_status': self._status.pop(path, 0),
+                'messages': self._messages.pop(path, [])}
+
+    def flush_others(self):
+        """
+        Write the output of files that were not asked for.
+
+        :return: The status bits set by their messages.
+        """
+        status = 0
+        for path in sorted(self._outputs):
+            self._stdout.write(self._outputs[path].getvalue())
+            status |= self._status[path]
+        self._outputs = {}
+        self._status = {}
+        self._messages = {}
+        return status
+
+
+def _pack(clusters, count):
+    """
+    Spread clusters of files across at most count shards of similar size.
+    """
+    shards = [[] for _ in range(min(count, len(clusters)))]
+    for cluster in sorted(clusters, key=len, reverse=True):
+        min(shards, key=len).extend(cluster)
+    return [shard for shard in shards if shard]
+
+
+# Where the shards linted in worker processes send the verdicts
+_SHARD_QUEUE = None
+
+
+def _init_shard(queue):
+    global _SHARD_QUEUE
+    _SHARD_QUEUE = queue
+
+
+def _send_verdict(path, verdict, timing):
+    _SHARD_QUEUE.put((path, verdict, timing))
+
+
+def _lint_shard(options, paths, import_paths, module_done):
+    """
+    Run pylint on some python files, keeping their output.
+
+    :param options: pylint command line options.
+    :param paths: Paths to python files.
+    :param import_paths: Directories added to sys.path.
+    :param module_done: Called with the path, the verdict (see
+                        :meth:`ModuleReporter.verdict`) and the wall and CPU
+                        time of each file, as soon as pylint is done with
+                        it. Files pylint checks in processes of its own are
+                        done when the whole run is.
+    :return: Dictionary with the 'verdicts' of the files, keyed by their
+             absolute path, the 'output' and 'msg_status' of the messages
+             not related to them and whether each module failed
+             ('by_module').
+    """
+    for import_path in reversed(import_paths):
+        if import_path not in sys.path:
+            sys.path.insert(0, import_path)
+    absolute = dict((os.path.abspath(path), path) for path in paths)
+    verdicts = {}
+
+    def finished(path):
+        if path in absolute and path not in verdicts:
+            verdicts[path] = reporter.verdict(path)
+            module_done(absolute[path], verdicts[path],
+                        reporter.timings.get(path, (None, None)))
+
+    output = six.StringIO()
+    reporter = ModuleReporter(output, finished)
+    runner = QuietLintRun(options + paths, reporter=reporter, exit=False)
+    reporter.finish_module()
+    for path in paths:
+        finished(os.path.abspath(path))
+    if hasattr(runner.linter.stats, 'get'):
+        items = runner.linter.stats.get('by_module').items()
+    else:
+        items = runner.linter.stats.by_module.items()
+    by_module = {}
+    for module, status in items:
+        status = dict(status)
+        status.pop("statement", None)
+        by_module[module] = any(status.values())
+    msg_status = reporter.global_status | reporter.flush_others()
+    return {'verdicts': verdicts, 'output': output.getvalue(),
+            'msg_status': msg_status, 'by_module': by_module}
+
+
 class Linter(object):
 
     def __init__(self, args, logger=logging.getLogger('')):
@@ -67,16 +292,33 @@ class Linter(object):
         if hasattr(args, 'parallel'):
             self.parallel = args.parallel
         else:
-            import multiprocessing
             self.parallel = multiprocessing.cpu_count()
         # Be able to analyze all imports inside the project
+        self.import_paths = [os.getcwd()]
         sys.path.insert(0, os.getcwd())
+        if getattr(args, 'since', None):
+            # Only the changed files are linted, make sure the modules
+            # they import can still be found from the top of the tree
+            work_tree = vcs.git_work_tree(os.getcwd())
+            if work_tree is not None and work_tree not in sys.path:
+                sys.path.insert(1, work_tree)
+                self.import_paths.append(work_tree)
+        # Where results are written as soon as they are reported
+        self.result_stream = None
+        self.output = get_output(args)
         self.log.info('Pylint disabled: %s', self.ignored_errors)
         self.log.info('Pylint enabled : %s', self.enabled_errors)
+        options = [opt for opt in self.get_opts()
+                   if not opt.startswith('--jobs=')]
+        self.cache = cache.get_cache(
+            args, 'lint', options=[options, self.import_paths],
+            versions=[getattr(pylint, '__version__', None),
+                      cache.source_digest(__name__),
+                      cache.source_digest(ImportGraph.__module__)])
 
     @staticmethod
     def _pylint_has_option(option):
-        return option in _PYLINT_HELP_TEXT
+        return option.strip('-=') in get_pylint_options()
 
     def get_opts(self):
         """
@@ -101,43 +343,152 @@ class Linter(object):
         return pylint_args
 
     def check(self, file_or_dirs):
-        def should_be_checked(path):
-            checker = PathChecker(path=path, args=self.args, label='Lint',
-                                  logger=self.log)
-            return checker.check_attributes('text', 'python', 'not_empty')
-        paths = []
-        not_file_or_dirs = []
-        for file_or_dir in file_or_dirs:
-            if os.path.isdir(file_or_dir):
-                for root, _, files in os.walk(file_or_dir):
-                    for filename in files:
-                        path = os.path.join(root, filename)
-                        if should_be_checked(path):
-                            paths.append(path)
-            elif os.path.isfile(file_or_dir):
-                if should_be_checked(file_or_dir):
-                    paths.append(file_or_dir)
-            else:
-                not_file_or_dirs.append(file_or_dir)
-        linter_failed = True
-        if paths:
-            runner = QuietLintRun(self.get_opts() + paths, exit=False)
-            if hasattr(runner.linter.stats, 'get'):
-                items = runner.linter.stats.get('by_module').items()
-            else:
-                items = runner.linter.stats.by_module.items()
-            for module, status in items:
-                status.pop("statement")
-                if any(status.values()):
+        manifest = Manifest(file_or_dirs, self.args, logger=self.log)
+        if manifest.since_failed:
+            return 0
+        status = self.check_manifest(manifest)
+        if manifest.invalid:
+            self.log.error("Following arguments are not files nor dirs: %s",
+                           ", ".join(manifest.invalid))
+            return 0
+        return status
+
+    def check_manifest(self, manifest):
+        """
+        Run pylint on all the files of a manifest.
+
+        :param manifest: :class:`inspektor.manifest.Manifest` instance.
+        """
+        return self.check_files(manifest.files)
+
+    def check_files(self, paths):
+        """
+        Run pylint on a list of python files.
+
+        When the result cache is enabled, the messages of each file are
+        cached, keyed by the path and contents of the file and by the
+        contents of all the project modules it imports, directly or not. Only the files whose key
+        changed are linted again, the cached messages of the others are
+        replayed.
+
+        :param paths: Paths to python files.
+        """
+        if not paths:
+            return 0
+        # The imports of unchanged files don't have to be parsed again
+        graph = ImportGraph(
+            cache=cache.get_cache(
+                self.args, 'imports',
+                versions=[cache.source_digest(ImportGraph.__module__)]),
+            import_paths=self.import_paths)
+        keys = {}
+        verdicts = {}
+        if self.cache.enabled:
+            for path in paths:
+                stopwatch = Stopwatch()
+                digest = graph.digest(os.path.abspath(path))
+                keys[path] = self.cache.key(digest.encode('ascii'))
+                verdict = self.cache.get(keys[path])
+                self.cache.account(verdict is not None)
+                if verdict is not None:
+                    verdicts[path] = verdict
+                    self._write_result(path, verdict, True,
+                                       stopwatch.elapsed())
+
+        msg_status = 0
+        stale = [path for path in paths if path not in verdicts]
+        if stale:
+            result = self._lint(graph, stale,
+                                functools.partial(self._linted, keys))
+            self.output.write(result['output'])
+            msg_status |= result['msg_status']
+            for module, failed in sorted(result['by_module'].items()):
+                if failed:
                     self.log.debug('Lint: %s FAIL', module)
                 else:
                     self.log.debug('Lint: %s PASS', module)
-            if runner.linter.msg_status == 0:
-                linter_failed = False
-        if not_file_or_dirs:
-            self.log.error("Following arguments are not files nor dirs: %s",
-                           ", ".join(not_file_or_dirs))
-            return 0
-        if linter_failed:
+            for path in stale:
+                verdicts[path] = result['verdicts'][os.path.abspath(path)]
+
+        for path in paths:
+            verdict = verdicts[path]
+            self.output.write(verdict['output'])
+            msg_status |= verdict['msg_status']
+        if msg_status:
             return 0
         return 1
+
+    def _linted(self, keys, path, verdict, timing):
+        # Files are cached and reported as soon as pylint is done with them
+        self.cache.set(keys.get(path), verdict)
+        self._write_result(path, verdict,
+                           False if self.cache.enabled else None, timing)
+
+    def _write_result(self, path, verdict, cached, timing):
+        if self.result_stream is None:
+            return
+        messages = [tuple(message) for message in verdict.get('messages', [])]
+        self.result_stream.write(FileResult(
+            path, 'lint', status=not verdict['msg_status'], messages=messages,
+            cached=cached, duration=timing[0], cpu_time=timing[1]))
+
+    def _lint(self, graph, paths, module_done):
+        """
+        Run pylint on python files, in shards when running in parallel.
+
+        Shards are made of clusters of tightly coupled modules (see
+        :meth:`inspektor.imports.ImportGraph.clusters`), and each shard is
+        linted in a worker process of its own, instead of having pylint
+        spread the modules across its own workers.
+
+        :param module_done: Called for each file as soon as pylint is done
+                            with it (see :func:`_lint_shard`).
+        :return: Results of the shards, merged (see :func:`_lint_shard`).
+        """
+        jobs = int(self.parallel or 1)
+        shards = []
+        if jobs > 1 and len(paths) > 1:
+            absolute = dict((os.path.abspath(path), path) for path in paths)
+            clusters = graph.clusters(list(absolute))
+            shards = [[absolute[path] for path in shard]
+                      for shard in _pack(clusters, jobs)]
+        if len(shards) <= 1:
+            return _lint_shard(self.get_opts(), paths, self.import_paths,
+                               module_done)
+
+        options = [opt if not opt.startswith('--jobs=') else '--jobs=1'
+                   for opt in self.get_opts()]
+        self.log.debug('Lint: %d shards of %s files', len(shards),
+                       '/'.join(str(len(shard)) for shard in shards))
+        queue = multiprocessing.Queue()
+        pool = multiprocessing.Pool(len(shards), initializer=_init_shard,
+                                    initargs=(queue,))
+        try:
+            pending = [pool.apply_async(_lint_shard,
+                                        (options, shard, self.import_paths,
+                                         _send_verdict))
+                       for shard in shards]
+            # Each shard sends the verdict of each of its files once
+            for _ in range(sum(len(shard) for shard in shards)):
+                while True:
+                    try:
+                        module_done(*queue.get(timeout=1))
+                        break
+                    except six.moves.queue.Empty:
+                        # Don't wait for the files of a failed shard
+                        for shard in pending:
+                            if shard.ready():
+                                shard.get()
+            merged = {'verdicts': {}, 'output': '', 'msg_status': 0,
+                      'by_module': {}}
+            for shard in pending:
+                result = shard.get()
+                merged['verdicts'].update(result['verdicts'])
+                merged['output'] += result['output']
+                merged['msg_status'] |= result['msg_status']
+                merged['by_module'].update(result['by_module'])
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        return merged
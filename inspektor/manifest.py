@@ -0,0 +1,200 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Collection of the files checked during a run.
+"""
+import logging
+import os
+
+from .ignore import get_matcher
+from .path import PathChecker
+from .utils import exceptions
+from .utils import vcs
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+
+class _DirEntry(object):
+
+    """
+    Minimal stand in for :class:`os.DirEntry` on pythons without scandir.
+    """
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self, follow_symlinks=True):
+        if not follow_symlinks and os.path.islink(self.path):
+            return False
+        return os.path.isdir(self.path)
+
+    def is_file(self, follow_symlinks=True):
+        return os.path.isfile(self.path)
+
+    def stat(self, follow_symlinks=True):
+        return os.stat(self.path)
+
+
+def _scandir(directory):
+    if scandir is not None:
+        return scandir(directory)
+    return [_DirEntry(directory, name) for name in os.listdir(directory)]
+
+
+class Manifest(object):
+
+    """
+    Python files to be checked, gathered with a single directory walk.
+
+    Each file is classified once, so the checkers consuming the manifest
+    don't need to walk the tree or look at the file attributes again.
+    """
+
+    def __init__(self, paths, args, logger=logging.getLogger('')):
+        """
+        :param paths: Files and directories to be checked.
+        :param args: Parsed command line arguments.
+        :param logger: Logger used by the path checkers.
+        """
+        self.args = args
+        self.log = logger
+        self.ignore = get_matcher(args.exclude)
+        self.files = []
+        self.invalid = []
+        # Whether the files changed since --since couldn't be listed (the
+        # error is already logged, the manifest is then left empty)
+        self.since_failed = False
+        self._cwd = os.getcwd()
+        self._seen = set()
+        self._changed = None
+        since = getattr(args, 'since', None)
+        if since:
+            self._changed = self._get_changed_files(since)
+            if self._changed is None:
+                self.since_failed = True
+                return
+        for path in paths:
+            self.add(path)
+
+    def _get_changed_files(self, since):
+        work_tree = vcs.git_work_tree(self._cwd)
+        if work_tree is None:
+            self.log.error('Checking changes since %s needs a git '
+                           'repository', since)
+            return None
+        try:
+            changed = vcs.GitBackend().get_changed_files(since, work_tree)
+        except (exceptions.CmdError, OSError) as details:
+            self.log.error('Unable to get the files changed since %s: %s',
+                           since, details)
+            stderr = getattr(getattr(details, 'result', None), 'stderr', '')
+            for line in (stderr or '').splitlines():
+                self.log.error('%s', line)
+            return None
+        self.log.info('Checking %d files changed since %s', len(changed),
+                      since)
+        return sorted(changed)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def add(self, path):
+        """
+        Add a file, or all the files under a directory, to the manifest.
+
+        :param path: Path to a file or a directory.
+        """
+        if self._changed is not None:
+            self._add_changed_files(path)
+        elif os.path.isfile(path):
+            self._add_file(path)
+        elif os.path.isdir(path):
+            if not self._add_git_files(path):
+                self._walk(path)
+        else:
+            self.invalid.append(path)
+
+    def _add_changed_files(self, path):
+        absolute = os.path.normpath(os.path.join(self._cwd, path))
+        if os.path.isfile(path):
+            if absolute in self._changed:
+                self._add_file(path)
+        elif os.path.isdir(path):
+            prefix = os.path.join(absolute, '')
+            for changed in self._changed:
+                if changed.startswith(prefix):
+                    self._add_file(os.path.join(path,
+                                                changed[len(prefix):]))
+        else:
+            self.invalid.append(path)
+
+    def _add_git_files(self, directory):
+        """
+        Add the files git knows about, instead of walking the directory.
+
+        Git already keeps the list of tracked files and applies the
+        .gitignore rules to the untracked ones, so a single git ls-files
+        call replaces the directory walk. Git submodules are not listed.
+
+        :return: False if directory is not inside a git work tree, or if
+                 the files could not be listed.
+        """
+        if vcs.git_work_tree(directory) is None:
+            return False
+        if self.ignore.ignored(directory, is_dir=True):
+            return True
+        try:
+            for name in vcs.GitBackend().list_files(directory):
+                self._add_file(os.path.join(directory, name))
+        except (exceptions.CmdError, OSError) as details:
+            self.log.debug('Unable to list files with git: %s', details)
+            return False
+        return True
+
+    def _walk(self, top):
+        # Depth first, files before subdirectories, like os.walk() does.
+        # Ignored directories are pruned, so their contents are never
+        # listed nor classified.
+        if self.ignore.ignored(top, is_dir=True):
+            return
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = sorted(_scandir(directory), key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not self.ignore.ignored(entry.path, is_dir=True):
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    self._add_file(entry.path, entry)
+            pending.extend(reversed(subdirs))
+
+    def _add_file(self, path, dir_entry=None):
+        key = os.path.normpath(os.path.join(self._cwd, path))
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        checker = PathChecker(path=path, args=self.args, logger=self.log,
+                              dir_entry=dir_entry)
+        if checker.check_attributes('text', 'python', 'not_empty'):
+            self.files.append(path)
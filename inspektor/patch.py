@@ -17,8 +17,6 @@ import os
 import tempfile
 
 from . import indent
-from . import lint
-from . import style
 from . import utils
 from .path import PathChecker
 from .utils import vcs
@@ -45,6 +43,10 @@ class FileChecker(object):
         :param confirm: Whether to answer yes to all questions asked without
                 prompting the user.
         """
+        # pylint and pycodestyle are only imported when actually needed
+        from . import lint
+        from . import style
+
         assert args.disable is not None
         assert args.pep8_disable is not None
         self.args = args
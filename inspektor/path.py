@@ -12,47 +12,158 @@
 # Copyright: Red Hat 2013-2014
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
-import fnmatch
+import codecs
+import collections
+import io
+import logging
 import os
 import stat
-import logging
-import codecs
+import threading
+import tokenize
+from inspektor.ignore import get_matcher
 from inspektor.utils.data_structures import Borg
 
 PY_EXTENSIONS = ['.py']
 SHEBANG = '#!'
+# Files with these extensions are never looked at as text
+BINARY_EXTENSIONS = frozenset([
+    '.7z', '.a', '.bin', '.bmp', '.bz2', '.class', '.dat', '.db', '.dll',
+    '.dylib', '.egg', '.exe', '.gif', '.gz', '.h5', '.ico', '.jar', '.jpeg',
+    '.jpg', '.mo', '.mp3', '.mp4', '.npy', '.npz', '.o', '.onnx', '.pdf',
+    '.pickle', '.pkl', '.png', '.pt', '.pyc', '.pyd', '.pyo', '.so',
+    '.sqlite', '.tar', '.tgz', '.ttf', '.whl', '.woff', '.woff2', '.xz',
+    '.zip'])
+# Amount of bytes read to tell text from binary files
+SNIFF_SIZE = 8192
+DEFAULT_ENCODING = 'utf-8'
+
+_REGISTRY_LOCK = threading.Lock()
+
+
+def detect_encoding(raw):
+    """
+    Source encoding of python code, according to PEP 263.
+
+    :param raw: Beginning of the file, as bytes.
+    """
+    detect = getattr(tokenize, 'detect_encoding', None)
+    if detect is None:
+        return DEFAULT_ENCODING
+    try:
+        return detect(io.BytesIO(raw[:4096]).readline)[0]
+    except SyntaxError:
+        return DEFAULT_ENCODING
+
+
+def sniff_first_line(prefix, complete=True):
+    """
+    First line of a text file, or None if the file looks binary.
+
+    :param prefix: Beginning of the file, as bytes.
+    :param complete: Whether prefix holds the whole file.
+    """
+    if b'\0' in prefix:
+        return None
+    try:
+        decoder = codecs.getincrementaldecoder(detect_encoding(prefix))()
+        text = decoder.decode(prefix, final=complete)
+    except (LookupError, UnicodeDecodeError):
+        return None
+    line, newline, _ = text.partition('\n')
+    return line + newline
 
 
 class PathRegistry(Borg):
 
+    """
+    Attributes of the paths seen during the run, shared by all checkers.
+
+    The registry is safe to use from multiple threads. It is unbounded by
+    default, but can be turned into a least recently used cache holding
+    at most :attr:`maxsize` paths.
+    """
+
     def __init__(self):
         Borg.__init__(self)
-        if not getattr(self, 'registry', None):
-            self.registry = {}
+        with _REGISTRY_LOCK:
+            if 'registry' not in self.__dict__:
+                self.registry = collections.OrderedDict()
+                self.maxsize = None
+                self.lock = threading.RLock()
 
     def get(self, path):
-        return self.registry.get(path)
+        with self.lock:
+            path_attribute = self.registry.pop(path, None)
+            if path_attribute is not None:
+                self.registry[path] = path_attribute
+            return path_attribute
 
     def set(self, path_attribute):
-        self.registry[path_attribute.path] = path_attribute
+        with self.lock:
+            self.registry.pop(path_attribute.path, None)
+            self.registry[path_attribute.path] = path_attribute
+            self._evict()
+
+    def get_or_create(self, path, ignore_matcher, dir_entry=None):
+        """
+        Cached attributes of a path, created when first seen.
+        """
+        with self.lock:
+            path_attribute = self.get(path)
+            if path_attribute is None:
+                path_attribute = PathAttribute(path, ignore_matcher,
+                                               dir_entry=dir_entry)
+                self.set(path_attribute)
+            return path_attribute
+
+    def resize(self, maxsize=None):
+        """
+        Bound the registry to maxsize paths (None means unbounded).
+        """
+        with self.lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self):
+        if self.maxsize is not None:
+            while len(self.registry) > self.maxsize:
+                self.registry.popitem(last=False)
+
+    def invalidate(self, path=None):
+        """
+        Forget the attributes of a path, or of all paths if None.
+        """
+        with self.lock:
+            if path is None:
+                self.registry.clear()
+            else:
+                self.registry.pop(path, None)
 
 
 class PathAttribute(object):
-    def __init__(self, path, ignore_patterns):
-        path_registry = PathRegistry()
-        cached_path_attribute = path_registry.get(path=path)
-        if cached_path_attribute:
-            self.__dict__ = cached_path_attribute.__dict__
-        else:
-            self._path = path
-            self._ignore_patterns = ignore_patterns
-            self._ignore = None
-            self._text = None
-            self._first_line = None
-            self._executable = None
-            self._empty = None
-            self._python = None
-            path_registry.set(self)
+
+    """
+    Lazily evaluated attributes of a path.
+
+    Use :meth:`PathRegistry.get_or_create` to share the instances.
+    """
+
+    __slots__ = ('_path', '_ignore_matcher', '_dir_entry', '_mode', '_size',
+                 '_ignore', '_text', '_first_line', '_executable', '_python')
+
+    def __init__(self, path, ignore_matcher, dir_entry=None):
+        self._path = path
+        self._ignore_matcher = ignore_matcher
+        # Directory walks already know about the file, so reuse their
+        # entry to get its status with a single stat call
+        self._dir_entry = dir_entry
+        self._mode = None
+        self._size = None
+        self._ignore = None
+        self._text = None
+        self._first_line = None
+        self._executable = None
+        self._python = None
 
     def __str__(self):
         return self._path
@@ -61,6 +172,20 @@ class PathAttribute(object):
     def path(self):
         return self._path
 
+    def _load_status(self):
+        if self._mode is None:
+            try:
+                if self._dir_entry is not None:
+                    status = self._dir_entry.stat()
+                else:
+                    status = os.stat(self._path)
+                self._size = status.st_size
+                self._mode = status.st_mode
+            except OSError:
+                self._size = 0
+                self._mode = 0
+            self._dir_entry = None
+
     @property
     def text(self):
         if self._text is not None:
@@ -76,26 +201,37 @@ class PathAttribute(object):
     def binary(self):
         return not self.text
 
+    def _binary_extension(self):
+        return os.path.splitext(self._path)[1].lower() in BINARY_EXTENSIONS
+
     @property
     def first_line(self):
         if self._first_line is not None:
             return self._first_line
+        if self._text is False:
+            return None
 
-        if os.path.isfile(self._path):
+        self._load_status()
+        if stat.S_ISREG(self._mode) and not self._binary_extension():
+            # Only a bounded prefix is looked at, however big the file is
             try:
-                with codecs.open(self._path, 'r', encoding='utf-8') as checked_file:
-                    self._first_line = checked_file.readline()
-                    return self._first_line
-            except UnicodeDecodeError:
+                with open(self._path, 'rb') as checked_file:
+                    prefix = checked_file.read(SNIFF_SIZE)
+            except (IOError, OSError):
+                return None
+            self._first_line = sniff_first_line(
+                prefix, complete=len(prefix) < SNIFF_SIZE)
+            if self._first_line is None:
                 self._ignore = True
                 self._text = False
+            return self._first_line
 
     @property
     def executable(self):
         if self._executable is not None:
             return self._executable
-        mode = os.stat(self._path)[stat.ST_MODE]
-        self._executable = mode & stat.S_IXUSR
+        self._load_status()
+        self._executable = bool(self._mode & stat.S_IXUSR)
         return self._executable
 
     @property
@@ -104,11 +240,8 @@ class PathAttribute(object):
 
     @property
     def empty(self):
-        if self._empty is not None:
-            return self._empty
-        size = os.stat(self._path)[stat.ST_SIZE]
-        self._empty = size == 0
-        return self._empty
+        self._load_status()
+        return self._size == 0
 
     def script(self, language=None):
         if self.first_line:
@@ -135,53 +268,31 @@ class PathAttribute(object):
         if self._ignore is not None:
             return self._ignore
         else:
-            path = self._path
-            if path.startswith('./'):
-                path = path[2:]
-            for pattern in self._ignore_patterns:
-                if fnmatch.fnmatch(path, pattern):
-                    self._ignore = True
-                if self._path.startswith(os.path.abspath(pattern)):
-                    self._ignore = True
-            if self._ignore is None:
-                self._ignore = False
+            self._ignore = self._ignore_matcher.ignored(self._path,
+                                                        is_dir=False)
             return self._ignore
 
 
 class PathChecker(object):
 
-    def __init__(self, path, args, label=None, logger=logging.getLogger('')):
+    def __init__(self, path, args, label=None, logger=logging.getLogger(''),
+                 dir_entry=None):
         self.args = args
-        self.ignore = ['*~', '*#', '*.swp', '*.py?', '*.o', '.git', '.svn']
-        if self.args.exclude:
-            self.ignore += self.args.exclude.split(',')
-        self._read_gitignore()
-        self.path = PathAttribute(path, ignore_patterns=self.ignore)
+        self.ignore = get_matcher(self.args.exclude)
+        self.path = PathRegistry().get_or_create(path, self.ignore,
+                                                 dir_entry=dir_entry)
         if label is None:
             label = 'Check'
         self.label = label
         self.log = logger
 
-    def _read_gitignore(self):
-        config_ignore = '{home}/.config/git/ignore'.format(
-            home=os.environ.get('HOME'))
-        git_dir_ignore = '{gitdir}/.config/git/ignore'.format(
-            gitdir=os.environ.get('GIT_DIR'))
-        dot_ignore = '.gitignore'
-        for ign in (dot_ignore, git_dir_ignore, config_ignore):
-            if os.path.isfile(ign):
-                with open(ign) as f:
-                    self.ignore += [x.strip() for x in f.readlines()]
-                break
-        self.ignore = list(set(self.ignore))
-
     def check_attributes(self, *args):
         if self.path.ignore:
             return False
-        checks_passed = True
         for arg in args:
-            checks_passed &= getattr(self.path, arg)
-        return checks_passed
+            if not getattr(self.path, arg):
+                return False
+        return True
 
     def log_status(self, status, extra=''):
         if extra:
@@ -190,3 +301,72 @@ class PathChecker(object):
             self.log.debug('%s: %s %s %s', self.label, self.path, status, extra)
         elif status == 'FAIL':
             self.log.error('%s: %s %s %s', self.label, self.path, status, extra)
+
+
+class FileChecker(object):
+
+    """
+    Base of the checkers going through python files one by one.
+
+    Files are checked with check_content(), possibly in worker processes,
+    and the outcome is reported with :meth:`report` by the process
+    running the command.
+    """
+
+    # Label of the checker in the log messages
+    label = 'Check'
+
+    def __init__(self, args, logger=logging.getLogger('')):
+        self.args = args
+        self.log = logger
+        self.failed_paths = []
+        # Where results are written as soon as they are reported
+        self.result_stream = None
+        # Result cache of the checker, set by the subclasses
+        self.cache = None
+
+    def lookup(self, result, content):
+        """
+        Look a file up in the result cache, setting result.cached.
+
+        :param result: :class:`inspektor.result.FileResult` of the file.
+        :param content: :class:`inspektor.content.FileContent` of the file.
+        :return: The cache key of the file, to store the verdict with.
+        """
+        key = self.cache.key(content.raw)
+        if key is not None:
+            result.cached = bool(self.cache.get(key))
+        return key
+
+    def write_messages(self, result):
+        """
+        Write the messages of a result, for the checkers that show them.
+
+        :param result: :class:`inspektor.result.FileResult` instance.
+        """
+        pass
+
+    def report(self, result):
+        """
+        Report the outcome of checking a file.
+
+        :param result: :class:`inspektor.result.FileResult` instance.
+        :return: Whether the check passed.
+        """
+        self.cache.account(result.cached)
+        if self.result_stream is not None:
+            self.result_stream.write(result)
+        self.write_messages(result)
+        for level, message in result.log:
+            self.log.log(level, '%s', message)
+        if result.fix_status == 'FIX OK':
+            # The file may have been rewritten by a worker process
+            PathRegistry().invalidate(result.path)
+        checker = PathChecker(path=result.path, args=self.args,
+                              label=self.label, logger=self.log)
+        if result.status:
+            checker.log_status(status='PASS')
+        else:
+            self.failed_paths.append(result.path)
+            checker.log_status(status='FAIL', extra=result.fix_status)
+        return result.status
@@ -0,0 +1,149 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Scheduling of the checks made by checkall.
+"""
+import logging
+import sys
+
+from .content import get_content
+from .indent import Reindenter
+from .license import LicenseChecker
+from .lint import Linter
+from .style import StyleChecker
+from .report import get_output
+from .utils import parallel
+
+
+class FileChecks(object):
+
+    """
+    The per file checkers of checkall, run on a file one after another.
+    """
+
+    def __init__(self, args, logger=logging.getLogger(''), checkers=None):
+        """
+        :param args: Parsed command line arguments.
+        :param logger: Logger given to the checkers.
+        :param checkers: Per file checkers to use (built when None).
+        """
+        self.args = args
+        if checkers is None:
+            checkers = [Reindenter(args, logger=logger),
+                        StyleChecker(args, logger=logger)]
+            if not args.no_license_check:
+                checkers.append(LicenseChecker(args, logger=logger))
+        self.checkers = checkers
+
+    def check_content(self, path):
+        """
+        Check a python file with all the checkers.
+
+        The file is read once, all the checkers share its contents. With
+        --diff, the changes of all the checkers are combined in a single
+        diff, held by the last result.
+
+        :param path: Path to a python file.
+        :return: List of :class:`inspektor.result.FileResult`, one per
+                 checker.
+        """
+        content = get_content(self.args, path)
+        results = [checker.check_content(path, content)
+                   for checker in self.checkers]
+        if content.dry_run:
+            for result in results:
+                result.diff = None
+            results[-1].diff = content.diff() or None
+        return results
+
+
+def _lint(args, paths, result_stream, logger):
+    # Linters can't be sent to other processes, so each process has its own
+    linter = Linter(args, logger=parallel.worker_logger())
+    linter.log = logger
+    # The output is captured, the calling process writes it where it should
+    linter.output = sys.stdout
+    # Results are sent to the calling process as soon as they are known
+    linter.result_stream = result_stream
+    status = linter.check_files(paths)
+    return status, linter.cache.hits, linter.cache.misses
+
+
+class Pipeline(object):
+
+    """
+    Runs the checks of checkall concurrently.
+
+    Pylint, by far the slowest checker, runs in a process of its own,
+    while the per file checkers go through the files in a pool of worker
+    processes. Results are reported in the same order as in a serial run:
+    file by file, then the lint output.
+    """
+
+    def __init__(self, args, checkers, linter, logger=logging.getLogger('')):
+        """
+        :param args: Parsed command line arguments.
+        :param checkers: Per file checkers, reporting the results of
+                         :class:`FileChecks`, in the same order.
+        :param linter: :class:`inspektor.lint.Linter` instance.
+        :param logger: Logger where the results are reported.
+        """
+        self.args = args
+        self.checkers = checkers
+        self.linter = linter
+        self.log = logger
+        self.output = get_output(args)
+
+    def _start_lint(self, paths):
+        return parallel.Background(_lint, self.args, paths)
+
+    def _write_lint_results(self, lint, wait=False):
+        # The lint results are written by this process, as they come
+        for result in lint.items(wait):
+            if self.linter.result_stream is not None:
+                self.linter.result_stream.write(result)
+
+    def run(self, manifest):
+        """
+        Check all the files of a manifest.
+
+        :param manifest: :class:`inspektor.manifest.Manifest` instance.
+        :return: Whether all the checks passed.
+        """
+        lint = None
+        if not self.args.fix or self.args.diff:
+            # With --fix, lint has to wait for the files to be fixed
+            lint = self._start_lint(manifest.files)
+
+        status = True
+        # In process, the checkers of the command do the checks themselves
+        checks = FileChecks(self.args, logger=self.log,
+                            checkers=self.checkers)
+        for results in parallel.imap(FileChecks, self.args, 'check_content',
+                                     manifest.files, self.args.jobs,
+                                     instance=checks):
+            for checker, result in zip(self.checkers, results):
+                status &= checker.report(result)
+            if lint is not None:
+                self._write_lint_results(lint)
+
+        if lint is None:
+            lint = self._start_lint(manifest.files)
+        self._write_lint_results(lint, wait=True)
+        value, output, records = lint.get()
+        self.output.write(output)
+        for level, message in records:
+            self.log.log(level, '%s', message)
+        if value is None:
+            return False
+        lint_status, self.linter.cache.hits, self.linter.cache.misses = value
+        return status and bool(lint_status)
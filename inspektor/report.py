@@ -0,0 +1,275 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Machine readable reports of the results of a run.
+"""
+import json
+import os
+import sys
+import time
+
+from six.moves.urllib.request import pathname2url
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+
+REPORT_FORMATS = ('json', 'sarif')
+
+# Base of the artifact URIs in SARIF reports, the working directory
+SARIF_ROOT = 'SRCROOT'
+
+
+class JsonLinesStream(object):
+
+    """
+    Writes one JSON record per checked file and checker, as soon as the
+    result is known, so consumers can follow a run while it goes on.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path to the output file, '-' for the standard output.
+        """
+        if path == '-':
+            self._file = sys.stdout
+        else:
+            self._file = open(path, 'w')
+
+    def write(self, result):
+        """
+        :param result: :class:`inspektor.result.FileResult` instance.
+        """
+        self._file.write(json.dumps(result.to_dict(), sort_keys=True) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class DiffStream(object):
+
+    """
+    Writes the diffs of the fixes previewed with --diff, making up a
+    single unified diff for the whole run.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path to the output file, '-' for the standard output.
+        """
+        if path == '-':
+            self._file = sys.stdout
+        else:
+            self._file = open(path, 'w')
+
+    def write(self, result):
+        """
+        :param result: :class:`inspektor.result.FileResult` instance.
+        """
+        if result.diff:
+            self._file.write(result.diff)
+            self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+def file_uri(path):
+    """
+    file:// URI of a path.
+
+    :param path: Path to a file or directory.
+    """
+    url = pathname2url(os.path.abspath(path))
+    if not url.startswith('//'):
+        url = '//' + url
+    return 'file:' + url
+
+
+def _total_cpu_time():
+    # Worker processes are accounted for once they have been waited for
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+class Report(object):
+
+    """
+    Report of all the results of a run, written when the run is over.
+
+    Besides the findings of every checker, it holds the wall and CPU
+    time spent on each file and on each checker, so it's possible to
+    tell which files or checkers dominate a run.
+    """
+
+    def __init__(self, path, report_format='json'):
+        """
+        :param path: Path to the report file, '-' for the standard output.
+        :param report_format: One of :data:`REPORT_FORMATS`.
+        """
+        self.path = path
+        self.report_format = report_format
+        self.results = []
+        # Paths in SARIF reports are relative to it when they can be
+        self.root = os.getcwd()
+        self._start = time.time()
+        self._start_cpu = _total_cpu_time()
+
+    def write(self, result):
+        """
+        :param result: :class:`inspektor.result.FileResult` instance.
+        """
+        self.results.append(result)
+
+    def stages(self):
+        """
+        Totals per checker: files checked and failed, wall and CPU time.
+        """
+        stages = {}
+        for result in self.results:
+            stage = stages.setdefault(result.checker,
+                                      {'files': 0, 'failed': 0,
+                                       'wall_time': 0.0, 'cpu_time': 0.0})
+            stage['files'] += 1
+            if not result.status:
+                stage['failed'] += 1
+            stage['wall_time'] += result.duration or 0.0
+            stage['cpu_time'] += result.cpu_time or 0.0
+        return stages
+
+    def to_json(self):
+        return {'wall_time': time.time() - self._start,
+                'cpu_time': _total_cpu_time() - self._start_cpu,
+                'stages': self.stages(),
+                'files': [result.to_dict() for result in self.results]}
+
+    def _artifact_location(self, path):
+        relative = os.path.relpath(os.path.abspath(path), self.root)
+        if relative.split(os.sep)[0] == os.pardir:
+            return {'uri': file_uri(path)}
+        return {'uri': pathname2url(relative), 'uriBaseId': SARIF_ROOT}
+
+    def to_sarif(self):
+        rules = set()
+        sarif_results = []
+        for result in self.results:
+            for line, column, code, text in result.messages:
+                rules.add(code)
+                if result.checker == 'lint':
+                    # pylint columns start at 0
+                    column += 1
+                    level = 'error' if code[:1] in 'EF' else 'warning'
+                elif result.checker == 'style':
+                    level = 'warning'
+                else:
+                    level = 'error'
+                location = {'artifactLocation':
+                            self._artifact_location(result.path),
+                            'region': {'startLine': max(line, 1),
+                                       'startColumn': max(column, 1)}}
+                sarif_results.append({
+                    'ruleId': code,
+                    'level': level,
+                    'message': {'text': text},
+                    'locations': [{'physicalLocation': location}],
+                    'properties': {'checker': result.checker}})
+        # Timings go with the invocation, findings are already results
+        timings = self.to_json()
+        timings['files'] = [dict((key, value) for key, value
+                                 in result.to_dict().items()
+                                 if key != 'messages')
+                            for result in self.results]
+        # Base URIs must end with a slash
+        root_uri = file_uri(self.root)
+        if not root_uri.endswith('/'):
+            root_uri += '/'
+        run = {'tool': {'driver': {'name': 'inspektor',
+                                   'informationUri':
+                                   'https://github.com/avocado-framework/'
+                                   'inspektor',
+                                   'rules': [{'id': code}
+                                             for code in sorted(rules)]}},
+               'originalUriBaseIds': {SARIF_ROOT: {'uri': root_uri}},
+               'results': sarif_results,
+               'invocations': [{'executionSuccessful': True,
+                                'properties': timings}]}
+        return {'$schema': SARIF_SCHEMA, 'version': '2.1.0', 'runs': [run]}
+
+    def close(self):
+        """
+        Write the report.
+        """
+        if self.report_format == 'sarif':
+            data = self.to_sarif()
+        else:
+            data = self.to_json()
+        if self.path == '-':
+            json.dump(data, sys.stdout, indent=2, sort_keys=True)
+            sys.stdout.write('\n')
+        else:
+            with open(self.path, 'w') as report_file:
+                json.dump(data, report_file, indent=2, sort_keys=True)
+
+
+class ResultStreams(object):
+
+    """
+    Writes the results to several streams.
+    """
+
+    def __init__(self, streams):
+        self.streams = streams
+
+    def write(self, result):
+        for stream in self.streams:
+            stream.write(result)
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+
+
+def get_stream(args):
+    """
+    Result stream requested with the --json-lines, --report and --diff
+    command line options.
+
+    :return: A stream with write(result) and close() methods, or None.
+    """
+    streams = []
+    if getattr(args, 'diff', None):
+        streams.append(DiffStream(args.diff))
+    if getattr(args, 'json_lines', None):
+        streams.append(JsonLinesStream(args.json_lines))
+    if getattr(args, 'report', None):
+        streams.append(Report(args.report,
+                              getattr(args, 'report_format', 'json')))
+    if not streams:
+        return None
+    if len(streams) == 1:
+        return streams[0]
+    return ResultStreams(streams)
+
+
+def get_output(args):
+    """
+    Stream for the human readable output of the checkers.
+
+    That's the standard output, unless a result stream is written there
+    (--json-lines -, --report - or --diff), in which case it's the standard
+    error, so the result stream can still be parsed.
+    """
+    for option in ('json_lines', 'report', 'diff'):
+        if getattr(args, option, None) == '-':
+            return sys.stderr
+    return sys.stdout
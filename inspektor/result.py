@@ -0,0 +1,113 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Results of checking files.
+"""
+import os
+import time
+
+
+def cpu_time():
+    """
+    CPU time used by the current process, user and system, in seconds.
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+class Stopwatch(object):
+
+    """
+    Measures the wall and CPU time spent checking a file.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.start_cpu = cpu_time()
+
+    def elapsed(self):
+        """
+        Wall and CPU time elapsed since the stopwatch was created.
+        """
+        return time.time() - self.start, cpu_time() - self.start_cpu
+
+    def stop(self, result):
+        """
+        Store the time elapsed since the stopwatch was created in a result.
+
+        :param result: :class:`FileResult` instance.
+        :return: The result.
+        """
+        result.duration, result.cpu_time = self.elapsed()
+        return result
+
+
+class FileResult(object):
+
+    """
+    Outcome of checking one file with one checker.
+
+    Results are plain data, so they can be produced in a worker process
+    and reported, in order, by the main one.
+    """
+
+    __slots__ = ('path', 'checker', 'status', 'messages', 'fix_status',
+                 'cached', 'log', 'duration', 'cpu_time', 'diff')
+
+    def __init__(self, path, checker, status=True, messages=None,
+                 fix_status='', cached=None, log=None, duration=None,
+                 cpu_time=None, diff=None):
+        """
+        :param path: Path to the checked file.
+        :param checker: Checker name.
+        :param status: True if the check passed.
+        :param messages: List of (line, column, code, text) findings.
+        :param fix_status: Outcome of the fix attempt, if any.
+        :param cached: Whether the verdict came from the cache (None if
+                       the cache is disabled).
+        :param log: List of (level, message) records to be logged.
+        :param duration: Time spent checking the file, in seconds.
+        :param cpu_time: CPU time spent checking the file, in seconds.
+        :param diff: Unified diff of the fix, when previewing fixes.
+        """
+        self.path = path
+        self.checker = checker
+        self.status = status
+        self.messages = messages or []
+        self.fix_status = fix_status
+        self.cached = cached
+        self.log = log or []
+        self.duration = duration
+        self.cpu_time = cpu_time
+        self.diff = diff
+
+    def to_dict(self):
+        """
+        JSON serializable representation of the result.
+        """
+        return {'path': self.path,
+                'checker': self.checker,
+                'status': 'PASS' if self.status else 'FAIL',
+                'messages': [{'line': line, 'column': column, 'code': code,
+                              'text': text}
+                             for line, column, code, text in self.messages],
+                'fix_status': self.fix_status,
+                'cached': self.cached,
+                'duration': self.duration,
+                'cpu_time': self.cpu_time}
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
@@ -12,38 +12,157 @@
 # Copyright: Red Hat 2013-2014
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
+import importlib
 import logging
 import os
 import sys
+import tokenize
 
 import pycodestyle
+import six
 
-try:
-    import autopep8
-    AUTOPEP8_CAPABLE = True
-    del(autopep8)
-except ImportError:
-    AUTOPEP8_CAPABLE = False
-
+from . import cache
+from .content import get_content
+from .manifest import Manifest
+from .path import FileChecker
 from .path import PathChecker
+from .report import get_output
+from .result import FileResult
+from .result import Stopwatch
+from .utils import parallel
 from .utils import stacktrace
-from .utils import process
 
 
-class StyleChecker(object):
+_AUTOPEP8 = None
+
+
+def get_autopep8():
+    """
+    The autopep8 module, imported when it's first needed.
+
+    :return: The module, or False if autopep8 is not installed.
+    """
+    global _AUTOPEP8
+    if _AUTOPEP8 is None:
+        try:
+            _AUTOPEP8 = importlib.import_module('autopep8')
+        except ImportError:
+            _AUTOPEP8 = False
+    return _AUTOPEP8
+
+
+class _CollectingReport(pycodestyle.BaseReport):
+
+    """
+    Report that keeps the errors of a file, instead of printing them.
+    """
+
+    def __init__(self, options):
+        super(_CollectingReport, self).__init__(options)
+        self._repeat = options.repeat
+
+    def init_file(self, filename, lines, expected, line_offset):
+        self.findings = []
+        return super(_CollectingReport, self).init_file(filename, lines,
+                                                        expected, line_offset)
+
+    def error(self, line_number, offset, text, check):
+        code = super(_CollectingReport, self).error(line_number, offset,
+                                                    text, check)
+        if code and (self.counters[code] == 1 or self._repeat):
+            self.findings.append((line_number, offset + 1, code, text[5:]))
+        return code
+
+
+class _SharedTokensChecker(pycodestyle.Checker):
+
+    """
+    Checker taking the tokens of a file from its shared contents, instead
+    of tokenizing the file once more.
+    """
+
+    def __init__(self, content, options):
+        super(_SharedTokensChecker, self).__init__(content.path,
+                                                   lines=content.lines,
+                                                   options=options)
+        self.content = content
+
+    def generate_tokens(self):
+        # No other checker looks at the tokens after pycodestyle
+        tokens = self.content.generate_tokens(keep=False)
+        try:
+            prev_physical = ''
+            for token in tokens:
+                if token[2][0] > self.total_lines:
+                    return
+                # Read the lines up to the token, as tokenize would have
+                while self.line_number < token[3][0] and self.readline():
+                    pass
+                self.noqa = token[4] and pycodestyle.noqa(token[4])
+                self.maybe_check_physical(token, prev_physical)
+                yield token
+                prev_physical = token[4]
+        except (SyntaxError, tokenize.TokenError):
+            self.report_invalid_syntax()
+
+
+def _shares_tokens():
+    """
+    Whether pycodestyle runs its physical line checks the way
+    :class:`_SharedTokensChecker` does (pycodestyle 2.4 and later).
+    """
+    function = six.get_unbound_function(
+        pycodestyle.Checker.maybe_check_physical)
+    return function.__code__.co_argcount == 3
+
+
+# Older versions of pycodestyle tokenize the files themselves
+_SHARE_TOKENS = _shares_tokens()
+
+
+class StyleChecker(FileChecker):
+
+    label = 'Style'
 
     def __init__(self, args, logger=logging.getLogger('')):
+        super(StyleChecker, self).__init__(args, logger)
         # Be able to analyze all imports inside the project
-        sys.path.insert(0, os.getcwd())
-        self.log = logger
-        self.failed_paths = []
+        if os.getcwd() not in sys.path:
+            sys.path.insert(0, os.getcwd())
+        self.output = get_output(args)
         self.ignored_errors = ''
         if hasattr(args, 'disable'):
             self.ignored_errors = args.disable
         elif hasattr(args, 'disable_style'):
             self.ignored_errors = args.disable_style
-        self.args = args
+        self.jobs = getattr(args, 'jobs', 1) or 1
         self.log.info('PEP8 disabled: %s', self.ignored_errors)
+        self.guide = self._get_guide(self.ignored_errors)
+        options = self.guide.options
+        self.cache = cache.get_cache(
+            args, 'style',
+            options=[self.ignored_errors, sorted(options.ignore),
+                     sorted(options.select), options.max_line_length,
+                     getattr(args, 'max_line_length', None)],
+            versions=[pycodestyle.__version__, cache.source_digest(__name__)])
+
+    @staticmethod
+    def _get_guide(ignored_errors):
+        """
+        Style guide shared by all the files checked.
+
+        Options and the list of checks are set up once, and the checks
+        whose errors are all ignored are left out.
+        """
+        guide = pycodestyle.StyleGuide(reporter=_CollectingReport)
+        options = guide.options
+        ignore_list = [code for code in ignored_errors.split(',')
+                       if code] + list(options.ignore)
+        options.ignore = tuple(set(ignore_list))
+        options.physical_checks = guide.get_checks('physical_line')
+        options.logical_checks = guide.get_checks('logical_line')
+        options.ast_checks = guide.get_checks('tree')
+        return guide
 
     def check_dir(self, path):
         """
@@ -51,66 +170,116 @@ class StyleChecker(object):
 
         :param path: Path to a directory.
         """
-        for root, dirs, files in os.walk(path):
-            for filename in files:
-                self.check_file(os.path.join(root, filename))
+        return self.check_manifest(Manifest([path], self.args, self.log))
+
+    def check_manifest(self, manifest):
+        """
+        Check all the files of a manifest with PEP8.
+
+        With more than one job, files are spread across worker processes,
+        and results are reported in the same order as in a serial run.
+
+        :param manifest: :class:`inspektor.manifest.Manifest` instance.
+        """
+        for result in parallel.imap(StyleChecker, self.args, 'check_content',
+                                    manifest.files, self.jobs,
+                                    instance=self):
+            self.report(result)
         return not self.failed_paths
 
-    def check_file(self, path):
+    def check_file(self, path, content=None):
         """
         Check one regular file with pylint for py syntax errors.
 
         :param path: Path to a regular file.
+        :param content: :class:`inspektor.content.FileContent` of the file,
+                        shared with other checkers (read when None).
         :return: False, if pylint found syntax problems, True, if pylint didn't
                  find problems, or path is not a python module or script.
         """
-        checker = PathChecker(path=path, args=self.args, label='Style',
+        checker = PathChecker(path=path, args=self.args, label=self.label,
                               logger=self.log)
         if not checker.check_attributes('text', 'python', 'not_empty'):
             return True
+        return self.report(self.check_content(path, content))
+
+    def check_content(self, path, content=None):
+        """
+        Check a python file with PEP8, without reporting the outcome.
+
+        :param path: Path to a python file.
+        :param content: :class:`inspektor.content.FileContent` of the file
+                        (read when None).
+        :rtype: :class:`inspektor.result.FileResult`
+        """
+        stopwatch = Stopwatch()
+        if content is None:
+            content = get_content(self.args, path)
+        result = FileResult(path, 'style')
+        cache_key = self.lookup(result, content)
+        if result.cached:
+            return stopwatch.stop(result)
 
         try:
-            opt_obj = pycodestyle.StyleGuide().options
-            ignore_list = self.ignored_errors.split(',') + list(opt_obj.ignore)
-            opt_obj.ignore = tuple(set(ignore_list))
-            # pylint: disable=E1123
-            runner = pycodestyle.Checker(filename=path, options=opt_obj)
-            status = runner.check_all()
+            if _SHARE_TOKENS:
+                checker = _SharedTokensChecker(content, self.guide.options)
+            else:
+                checker = pycodestyle.Checker(path, lines=content.lines,
+                                              options=self.guide.options)
+            status = checker.check_all()
+            result.messages = self.guide.options.report.findings
         except Exception:
-            self.log.error('Unexpected exception while checking %s', path)
+            result.log.append((logging.ERROR, 'Unexpected exception while '
+                               'checking %s' % path))
             exc_info = sys.exc_info()
-            stacktrace.log_exc_info(exc_info, 'inspektor.style')
+            for line in stacktrace.prepare_exc_info(exc_info).splitlines():
+                result.log.append((logging.ERROR, line))
             status = 1
 
-        if status != 0:
-            self.failed_paths.append(path)
-            fix_status = ''
-            if AUTOPEP8_CAPABLE:
-                if self.args.fix:
-                    self.log.info('Trying to fix errors with autopep8')
-                    try:
-                        process.run('autopep8 --in-place --max-line-length=%s --ignore %s %s' % (self.args.max_line_length, self.ignored_errors, path))
-                        fix_status = 'FIX OK'
-                    except Exception:
-                        self.log.error('Unable to fix errors')
-                        exc_info = sys.exc_info()
-                        stacktrace.log_exc_info(exc_info, 'inspektor.style')
-                        fix_status = 'FIX NOT OK'
+        result.status = status == 0
+        if not result.status and self.args.fix:
+            autopep8 = get_autopep8()
+            if autopep8:
+                result.log.append((logging.INFO,
+                                   'Trying to fix errors with autopep8'))
+                try:
+                    # An empty code would make autopep8 ignore them all
+                    ignore = [code for code in self.ignored_errors.split(',')
+                              if code]
+                    options = {'max_line_length': self.args.max_line_length,
+                               'ignore': ignore}
+                    fixed = autopep8.fix_code(content.text, options=options)
+                    content.write(fixed)
+                    result.fix_status = 'FIX OK'
+                    if content.dry_run:
+                        result.diff = content.diff()
+                except Exception:
+                    result.log.append((logging.ERROR, 'Unable to fix errors'))
+                    exc_info = sys.exc_info()
+                    for line in stacktrace.prepare_exc_info(
+                            exc_info).splitlines():
+                        result.log.append((logging.ERROR, line))
+                    result.fix_status = 'FIX NOT OK'
             else:
-                self.log.error('Python library autopep8 not installed. '
-                               'Please install it if you want to use --fix')
-                fix_status = 'FIX NOT OK'
-            checker.log_status(status='FAIL', extra=fix_status)
-        else:
-            checker.log_status(status='PASS')
+                result.log.append((logging.ERROR,
+                                   'Python library autopep8 not installed. '
+                                   'Please install it if you want to use '
+                                   '--fix'))
+                result.fix_status = 'FIX NOT OK'
+        elif result.status and cache_key is not None:
+            self.cache.set(cache_key, {'status': True})
+        return stopwatch.stop(result)
 
-        return status == 0
+    def write_messages(self, result):
+        for message in result.messages:
+            self.output.write('%s:%d:%d: %s %s\n' %
+                              ((result.path,) + tuple(message)))
 
     def check(self, path):
-        if os.path.isfile(path):
-            return self.check_file(path)
-        elif os.path.isdir(path):
-            return self.check_dir(path)
-        else:
+        manifest = Manifest([path], self.args, self.log)
+        if manifest.since_failed:
+            return False
+        if manifest.invalid:
             self.log.error("Invalid location '%s'", path)
             return False
+        return self.check_manifest(manifest)
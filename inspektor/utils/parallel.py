@@ -0,0 +1,198 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Run checkers over many files using a pool of worker processes.
+"""
+import collections
+import logging
+import multiprocessing
+import sys
+
+import six
+
+from . import stacktrace
+
+# Chunks of items in flight per worker process
+WINDOW = 2
+
+_WORKER = None
+
+
+def worker_logger():
+    """
+    Logger for checkers living in worker processes.
+
+    Workers return everything worth reporting in their results, so that
+    the main process can report it in a deterministic order.
+    """
+    logger = logging.getLogger('inspektor.worker')
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def _init_worker(factory, args):
+    global _WORKER
+    _WORKER = factory(args, logger=worker_logger())
+
+
+def _call_worker(method, items):
+    worker = getattr(_WORKER, method)
+    return [worker(item) for item in items]
+
+
+def imap(factory, args, method, items, jobs=1, instance=None):
+    """
+    Call a checker method on each item, yielding the results in order.
+
+    Items are sent to the workers in chunks, and only a few chunks per
+    worker are in flight at any time, so results waiting to be reported
+    don't pile up in memory when the consumer is slower than the workers.
+
+    :param factory: Checker class, called as factory(args, logger=...)
+                    once per worker process.
+    :param args: Parsed command line arguments given to the factory.
+    :param method: Name of the checker method called for each item.
+    :param items: List of items, usually paths.
+    :param jobs: Number of worker processes. With 1 (or a single item)
+                 everything runs in the calling process.
+    :param instance: Checker used when everything runs in the calling
+                     process, usually the caller itself (one is built
+                     with the factory when None).
+    """
+    if jobs <= 1 or len(items) <= 1:
+        worker = instance
+        if worker is None:
+            worker = factory(args, logger=worker_logger())
+        for item in items:
+            yield getattr(worker, method)(item)
+        return
+
+    jobs = min(jobs, len(items))
+    chunksize = max(1, min(16, len(items) // (jobs * 4)))
+    chunks = (items[i:i + chunksize]
+              for i in range(0, len(items), chunksize))
+    pool = multiprocessing.Pool(jobs, initializer=_init_worker,
+                                initargs=(factory, args))
+    try:
+        pending = collections.deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_call_worker, (method, chunk)))
+            if len(pending) >= jobs * WINDOW:
+                for result in pending.popleft().get():
+                    yield result
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class _RecordCollector(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+
+class _Sender(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, item):
+        self.connection.send(('item', item))
+
+
+def _run_captured(connection, function, args):
+    logger = logging.getLogger('inspektor.worker.captured')
+    logger.propagate = False
+    collector = _RecordCollector()
+    logger.addHandler(collector)
+    output = six.StringIO()
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        value = function(*(args + (_Sender(connection), logger)))
+    except Exception:
+        value = None
+        collector.records.append(
+            (logging.ERROR, stacktrace.prepare_exc_info(sys.exc_info())))
+    finally:
+        sys.stdout = stdout
+        logger.removeHandler(collector)
+    connection.send(('done', (value, output.getvalue(), collector.records)))
+    connection.close()
+
+
+class Background(object):
+
+    """
+    Function call running in a separate process.
+
+    Whatever the function prints and logs is captured, so that the
+    caller can report it when it sees fit. Unlike pool workers, the
+    process may start processes of its own.
+    """
+
+    def __init__(self, function, *args):
+        """
+        :param function: Module level function, called with the given
+                         arguments plus a stream, whose write() method
+                         sends an item to the caller right away, and a
+                         logger.
+        """
+        self._receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_run_captured, args=(sender, function, args))
+        self._process.start()
+        sender.close()
+        self._result = None
+
+    def items(self, wait=False):
+        """
+        Items sent by the function so far.
+
+        :param wait: Whether to wait for the function to return, so that
+                     all its items are yielded.
+        """
+        while self._result is None and (wait or self._receiver.poll()):
+            try:
+                kind, value = self._receiver.recv()
+            except EOFError:
+                kind, value = 'done', (None, '', [
+                    (logging.ERROR, 'Background process died unexpectedly')])
+            if kind == 'item':
+                yield value
+            else:
+                self._result = value
+
+    def get(self):
+        """
+        Wait for the call to finish.
+
+        Items sent by the function and not read with :meth:`items` are
+        dropped.
+
+        :return: Tuple with the value returned by the function, its output
+                 and a list of (level, message) log records.
+        """
+        for _ in self.items(wait=True):
+            pass
+        self._process.join()
+        return self._result
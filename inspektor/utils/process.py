@@ -12,9 +12,12 @@
 # Copyright: Red Hat 2013-2014
 # Author: Lucas Meneghel Rodrigues <lmr@redhat.com>
 
+import locale
 import logging
+import os
 import shlex
 import subprocess
+import tempfile
 import time
 
 from . import exceptions
@@ -73,3 +76,57 @@ def run(cmd, verbose=True, ignore_status=False, shell=False):
     if p.returncode != 0 and not ignore_status:
         raise exceptions.CmdError(cmd, result)
     return result
+
+
+def iter_output(cmd, separator=b'\n', cwd=None, verbose=True,
+                ignore_status=False):
+    """
+    Run a command, yielding the items of its output as they are produced.
+
+    :param cmd: Command line.
+    :param separator: Bytes separating the output items.
+    :param cwd: Directory the command is run from.
+    :raise CmdError: If the command fails, after all items were yielded.
+    """
+    if verbose:
+        log.info("Running '%s'", cmd)
+    start = time.time()
+    stderr = tempfile.TemporaryFile()
+    p = subprocess.Popen(shlex.split(cmd), stdout=subprocess.PIPE,
+                         stderr=stderr, cwd=cwd)
+    read = getattr(p.stdout, 'read1', p.stdout.read)
+    pending = b''
+    try:
+        while True:
+            chunk = read(65536)
+            if not chunk:
+                break
+            items = (pending + chunk).split(separator)
+            pending = items.pop()
+            for item in items:
+                yield _decode_path(item)
+        if pending:
+            yield _decode_path(pending)
+    finally:
+        p.stdout.close()
+        p.wait()
+    if p.returncode != 0 and not ignore_status:
+        stderr.seek(0)
+        result = CmdResult(cmd, stderr=_decode_output(stderr.read()),
+                           exit_status=p.returncode,
+                           duration=time.time() - start)
+        raise exceptions.CmdError(cmd, result)
+    stderr.close()
+
+
+def _decode_output(data):
+    # Error messages are only logged, undecodable bytes can be replaced
+    encoding = locale.getpreferredencoding(False) or 'utf-8'
+    return data.decode(encoding, 'replace')
+
+
+def _decode_path(item):
+    decode = getattr(os, 'fsdecode', None)
+    if decode is None:
+        return item
+    return decode(item)
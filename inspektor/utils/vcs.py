@@ -23,6 +23,24 @@ from . import exceptions
 from . import process
 
 
+def git_work_tree(path):
+    """
+    Top directory of the git work tree containing path, or None.
+
+    :param path: Path to a file or directory.
+    """
+    directory = os.path.abspath(path)
+    if not os.path.isdir(directory):
+        directory = os.path.dirname(directory)
+    while True:
+        if os.path.exists(os.path.join(directory, '.git')):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
 class VCS(object):
 
     """
@@ -311,6 +329,38 @@ class GitBackend(object):
                     modified_files.append(line.split()[-1])
         return modified_files
 
+    def list_files(self, directory):
+        """
+        Files under a directory that are tracked, or untracked but not
+        ignored, streamed from a single git ls-files call.
+
+        :param directory: Directory inside a git work tree.
+        :return: Generator of paths, relative to directory.
+        """
+        return process.iter_output("git ls-files -z --cached --others "
+                                   "--exclude-standard", separator=b'\0',
+                                   cwd=directory, verbose=False)
+
+    def get_changed_files(self, revision, work_tree):
+        """
+        Files added or modified in the work tree since a revision.
+
+        :param revision: Git revision. When it ends with '...', changes
+                         are taken from its merge base with HEAD instead.
+        :param work_tree: Top directory of the git work tree.
+        :return: List of absolute paths.
+        """
+        if revision.endswith('...'):
+            merge_base = list(process.iter_output(
+                "git merge-base %s HEAD" % revision[:-3], cwd=work_tree,
+                verbose=False))
+            revision = merge_base[0].strip()
+        changed = process.iter_output("git diff --name-only -z "
+                                      "--diff-filter=ACMR %s" % revision,
+                                      separator=b'\0', cwd=work_tree,
+                                      verbose=False)
+        return [os.path.join(work_tree, name) for name in changed]
+
     def is_file_tracked(self, fl):
         try:
             process.run("git ls-files %s --error-unmatch" % fl, verbose=False)
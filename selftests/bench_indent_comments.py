@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Benchmark of the reindentation of files with long runs of comment lines.
+
+Comments are reindented relative to the statements around them, and
+looking those up used to take time quadratic in the number of comment
+lines. A synthetic file with many indented comment lines is reindented
+at two sizes, and the benchmark fails when doubling the size much more
+than doubles the time.
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from inspektor.indent import Run  # pylint: disable=C0413
+
+# Time ratio between twice as many lines and the base number of lines,
+# linear time gives about 2, quadratic time about 4
+MAX_RATIO = 3.0
+
+
+def synthetic_file(comments):
+    """
+    Lines of a function with a long run of comment lines.
+
+    The body is wrongly indented, so that the file has to be tokenized
+    and reindented. The run starts with comments of distinct widths, the
+    statements around each of them have to be looked up, and there are
+    more of them in larger files.
+
+    :param comments: Number of comment lines.
+    """
+    widths = max(1, comments // 100)
+    lines = ['def f():\n']
+    lines.extend(' ' * (6 + i) + '# comment %d\n' % i
+                 for i in range(widths))
+    lines.extend('     # comment %d\n' % i
+                 for i in range(widths, comments))
+    lines.append('  return 1\n')
+    return lines
+
+
+def time_run(comments, repeat=3):
+    """
+    Reindent a synthetic file.
+
+    :param comments: Number of comment lines.
+    :param repeat: Number of runs.
+    :return: Best time spent in :meth:`inspektor.indent.Run.run`, in
+             seconds.
+    """
+    lines = synthetic_file(comments)
+    best = None
+    for _ in range(repeat):
+        run = Run(list(lines))
+        start = time.time()
+        changed = run.run()
+        elapsed = time.time() - start
+        if not changed or run.after[-1] != '    return 1\n':
+            raise AssertionError('The synthetic file was not reindented')
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--lines', type=int, default=100000,
+                        help='Number of comment lines of the largest file. '
+                             'Default: %(default)s')
+    args = parser.parse_args()
+
+    half = time_run(args.lines // 2)
+    full = time_run(args.lines)
+    ratio = full / max(half, 1e-6)
+    print('%d comment lines: %.2fs' % (args.lines // 2, half))
+    print('%d comment lines: %.2fs' % (args.lines, full))
+    print('Ratio: %.2f (max %.2f)' % (ratio, MAX_RATIO))
+    if ratio > MAX_RATIO:
+        print('FAIL: reindenting comment lines is no longer linear')
+        return 1
+    print('PASS')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
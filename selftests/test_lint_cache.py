@@ -0,0 +1,88 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+#
+# See LICENSE for more details.
+
+"""
+Tests of the lint result cache.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import astroid
+import six
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from inspektor.lint import Linter  # pylint: disable=C0413
+
+
+class LintCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.environ = dict(os.environ)
+        self.tmpdir = tempfile.mkdtemp(prefix='inspektor-selftest-')
+        os.environ['XDG_CACHE_HOME'] = os.path.join(self.tmpdir, 'cache')
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, path, content):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as source:
+            source.write(content)
+
+    def lint(self, paths, no_cache=False):
+        args = argparse.Namespace(disable='C,R', enable='', parallel=1,
+                                  no_cache=no_cache)
+        # Each run of inspekt starts with no module inferred yet
+        astroid.MANAGER.astroid_cache.clear()
+        linter = Linter(args)
+        linter.output = six.StringIO()
+        status = linter.check_files(paths)
+        return status, linter.output.getvalue(), linter.cache.hits
+
+    def test_import_cycle(self):
+        # Both modules have the same import closure
+        self.write('pkg/__init__.py', '')
+        self.write('pkg/a.py', 'import os\nfrom pkg import b\n')
+        self.write('pkg/b.py', 'from pkg import a\n')
+        paths = ['pkg/a.py', 'pkg/b.py']
+        cold = self.lint(paths)
+        warm = self.lint(paths)
+        self.assertIn('Unused import os', cold[1])
+        self.assertEqual(warm[2], 2)
+        self.assertEqual(warm[:2], cold[:2])
+
+    def test_import_path(self):
+        # lib is found from the working directory, not from tools
+        self.write('lib/core.py', 'def helper():\n    return 1\n')
+        self.write('tools/run.py', 'from lib.core import helper\n\nhelper()\n')
+        self.assertEqual(self.lint(['tools/run.py'])[0], 1)
+        self.write('lib/core.py', 'def other():\n    return 1\n')
+        status, output, hits = self.lint(['tools/run.py'])
+        self.assertEqual(hits, 0)
+        self.assertIn('E0611', output)
+        self.assertEqual(status, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()